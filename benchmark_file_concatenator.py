@@ -0,0 +1,224 @@
+import sys, os, json, time, random, shutil, argparse, platform, tempfile, subprocess, codecs
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+SCENARIOS = ('small_files', 'huge_files', 'deep_nesting', 'mixed_encodings', 'binaries')
+LOWER_IS_BETTER = ('import_s', 'startup_s', 'select_cold_s', 'select_warm_s', 'copy_s', 'drag_s', 'peak_rss_mb')
+PYTHON_LINE = "def function_{0}(value):\n    return value * {0}  # comment {0}\n\n"
+PROSE_LINE = "Café naïve résumé line {0}\n"
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _python_source(rng, lines):
+    return ''.join(PYTHON_LINE.format(rng.randrange(10 ** 6)) for _ in range(lines)).encode('utf-8')
+
+def build_tree(root, scenario, scale=1.0):
+    rng = random.Random(scenario)
+    count = lambda n: max(1, int(n * scale))
+    if scenario == 'small_files':
+        for i in range(count(4000)):
+            _write(os.path.join(root, f"pkg{i % 40:02d}", f"module_{i:05d}.py"), _python_source(rng, 12))
+    elif scenario == 'huge_files':
+        for i in range(3):
+            _write(os.path.join(root, f"huge_{i}.py"), _python_source(rng, count(100000)))
+        for i in range(2):
+            _write(os.path.join(root, f"large_{i}.py"), _python_source(rng, count(20000)))
+    elif scenario == 'deep_nesting':
+        directory = root
+        for depth in range(count(60)):
+            directory = os.path.join(directory, f"level_{depth:02d}")
+            for i in range(5):
+                _write(os.path.join(directory, f"file_{i}.py"), _python_source(rng, 8))
+    elif scenario == 'mixed_encodings':
+        encodings = (('utf-8', b''), ('utf-8', codecs.BOM_UTF8), ('cp1252', b''), ('utf-16', b''))
+        for i in range(count(600)):
+            encoding, bom = encodings[i % len(encodings)]
+            text = ''.join(PROSE_LINE.format(n) for n in range(40)).replace('\n', '\r\n' if i % 3 else '\n')
+            _write(os.path.join(root, encoding, f"doc_{i:04d}.txt"), bom + text.encode(encoding))
+    elif scenario == 'binaries':
+        for i in range(count(400)):
+            if i % 2:
+                _write(os.path.join(root, "assets", f"blob_{i:04d}.bin"), bytes(rng.randrange(256) for _ in range(4096)))
+            else:
+                _write(os.path.join(root, "src", f"code_{i:04d}.py"), _python_source(rng, 20))
+    else:
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _wait_until(app, predicate, timeout=300):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("benchmark step timed out")
+        app.processEvents()
+        time.sleep(0.001)
+
+def run_scenario(scenario, scale, workdir):
+    project = os.path.join(workdir, scenario, 'project')
+    build_tree(project, scenario, scale)
+    files = sum(len(names) for _, _, names in os.walk(project))
+    tree_bytes = sum(os.path.getsize(os.path.join(d, n)) for d, _, names in os.walk(project) for n in names)
+
+    from PyQt5.QtCore import QSettings, QItemSelectionModel
+    from PyQt5.QtWidgets import QApplication
+    QSettings.setPath(QSettings.NativeFormat, QSettings.UserScope, os.path.join(workdir, 'settings'))
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, os.path.join(workdir, 'settings'))
+    app = QApplication.instance() or QApplication([])
+
+    start = time.perf_counter()
+    import file_concatenator
+    import_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    window = file_concatenator.MainWindow()
+    window.show()
+    app.processEvents()
+    startup_s = time.perf_counter() - start
+
+    status = window.statusBar()
+    model = window.file_tree.model
+    window.file_tree.setRootIndex(model.index(os.path.dirname(project)))
+    selection_model = window.file_tree.selectionModel()
+    status.showMessage("")
+    start = time.perf_counter()
+    selection_model.select(model.index(project), QItemSelectionModel.Select | QItemSelectionModel.Rows)
+    _wait_until(app, lambda: status.currentMessage().startswith("Selected"))
+    select_cold_s = time.perf_counter() - start
+    selected = len(window.segments)
+
+    status.showMessage("")
+    start = time.perf_counter()
+    window._refresh()
+    _wait_until(app, lambda: status.currentMessage().startswith("Selected"))
+    select_warm_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    window._copy()
+    copied = len(QApplication.clipboard().mimeData().text())
+    copy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mime_data, _ = window.content_tabs.drag_payload()
+    mime_data.urls()
+    drag_s = time.perf_counter() - start
+
+    window.close()
+    return {
+        'files': files,
+        'tree_bytes': tree_bytes,
+        'selected_files': selected,
+        'output_chars': copied,
+        'import_s': import_s,
+        'startup_s': startup_s,
+        'select_cold_s': select_cold_s,
+        'select_warm_s': select_warm_s,
+        'copy_s': copy_s,
+        'drag_s': drag_s,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_all(scenarios, scale, workdir):
+    results = {}
+    for scenario in scenarios:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', scenario, '--scale', str(scale), '--workdir', workdir],
+            capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            print(child.stderr, file=sys.stderr)
+            results[scenario] = {'error': child.returncode}
+            continue
+        results[scenario] = json.loads(child.stdout.strip().splitlines()[-1])
+        print(f"{scenario}: " + ", ".join(
+            f"{key}={results[scenario][key]:.3f}" for key in LOWER_IS_BETTER if results[scenario].get(key) is not None
+        ), file=sys.stderr)
+    return {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': scale,
+        'results': results,
+    }
+
+def compare(baseline, current, threshold):
+    regressions = []
+    print(f"{'scenario':<16} {'metric':<14} {'baseline':>10} {'current':>10} {'change':>8}")
+    for scenario, metrics in current['results'].items():
+        base = baseline['results'].get(scenario, {})
+        for key in LOWER_IS_BETTER:
+            old, new = base.get(key), metrics.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ''
+            if change > threshold:
+                flag = ' !'
+                regressions.append((scenario, key, change))
+            print(f"{scenario:<16} {key:<14} {old:>10.3f} {new:>10.3f} {change:>+7.1%}{flag}")
+    return regressions
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark File Concatenator on synthetic project trees.")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help="Scenario to run; may be repeated (defaults to all)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply the size of every synthetic tree")
+    parser.add_argument('-o', '--output', help="Write JSON results to this file (defaults to stdout)")
+    parser.add_argument('--workdir', help="Directory for the synthetic trees (defaults to a temporary directory)")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated trees")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="Compare two result files instead of running")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown reported as a regression by --compare")
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args.scale, args.workdir)))
+        return 0
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for scenario, key, change in regressions:
+            print(f"Regression: {scenario} {key} {change:+.1%}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='file_concatenator_bench_')
+    try:
+        report = run_all(args.scenario or SCENARIOS, args.scale, workdir)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1643 @@
+import sys, os, re, io, gzip, json, mmap, time, zlib, errno, bisect, codecs, difflib, cProfile, hashlib, sqlite3, \
+    tarfile, zipfile, tokenize, threading, fnmatch, argparse, multiprocessing
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+EXTENSION_LANGUAGES = {
+    '.py': 'python', '.pyw': 'python', '.pyi': 'python',
+    '.js': 'javascript', '.mjs': 'javascript', '.cjs': 'javascript', '.jsx': 'jsx',
+    '.ts': 'typescript', '.tsx': 'tsx',
+    '.html': 'html', '.htm': 'html', '.css': 'css', '.scss': 'scss', '.less': 'less',
+    '.vue': 'vue', '.svelte': 'svelte',
+    '.java': 'java', '.kt': 'kotlin', '.kts': 'kotlin', '.scala': 'scala',
+    '.groovy': 'groovy', '.gradle': 'groovy',
+    '.cpp': 'cpp', '.cc': 'cpp', '.cxx': 'cpp', '.hpp': 'cpp', '.hh': 'cpp', '.h': 'cpp', '.c': 'c',
+    '.cs': 'csharp', '.fs': 'fsharp', '.vb': 'vbnet', '.go': 'go', '.rs': 'rust', '.swift': 'swift',
+    '.m': 'objectivec', '.dart': 'dart', '.zig': 'zig',
+    '.rb': 'ruby', '.php': 'php', '.pl': 'perl', '.pm': 'perl', '.lua': 'lua', '.r': 'r',
+    '.jl': 'julia', '.ex': 'elixir', '.exs': 'elixir', '.erl': 'erlang', '.hs': 'haskell',
+    '.ml': 'ocaml', '.clj': 'clojure',
+    '.sh': 'bash', '.bash': 'bash', '.zsh': 'zsh', '.fish': 'fish',
+    '.ps1': 'ps1', '.psm1': 'ps1', '.bat': 'batch', '.cmd': 'batch',
+    '.md': 'markdown', '.rst': 'rst', '.tex': 'latex',
+    '.json': 'json', '.xml': 'xml', '.svg': 'xml', '.yml': 'yaml', '.yaml': 'yaml', '.toml': 'toml',
+    '.ini': 'ini', '.cfg': 'ini', '.sql': 'sql', '.graphql': 'graphql', '.proto': 'protobuf',
+    '.tf': 'hcl', '.cmake': 'cmake', '.mk': 'makefile', '.dockerfile': 'dockerfile',
+    '.csv': 'csv', '.txt': 'text'
+}
+FILENAME_LANGUAGES = {
+    'dockerfile': 'dockerfile', 'containerfile': 'dockerfile',
+    'makefile': 'makefile', 'gnumakefile': 'makefile', 'cmakelists.txt': 'cmake',
+    'gemfile': 'ruby', 'rakefile': 'ruby', 'vagrantfile': 'ruby', 'podfile': 'ruby',
+    'jenkinsfile': 'groovy', 'pipfile': 'toml',
+    '.bashrc': 'bash', '.bash_profile': 'bash', '.profile': 'bash', '.zshrc': 'zsh',
+    '.editorconfig': 'ini', '.gitconfig': 'ini'
+}
+INTERPRETER_LANGUAGES = {
+    'python': 'python', 'pypy': 'python', 'sh': 'bash', 'bash': 'bash', 'dash': 'bash', 'ksh': 'bash',
+    'zsh': 'zsh', 'fish': 'fish', 'node': 'javascript', 'deno': 'typescript', 'ts-node': 'typescript',
+    'ruby': 'ruby', 'perl': 'perl', 'php': 'php', 'lua': 'lua', 'rscript': 'r', 'pwsh': 'ps1',
+    'make': 'makefile', 'awk': 'awk', 'tclsh': 'tcl'
+}
+_SHEBANG_RE = re.compile(r'#!\s*(\S+)(?:\s+(.*))?')
+_MODELINE_RE = re.compile(r'-\*-.*?\bmode:\s*([\w+-]+)|-\*-\s*([\w+-]+)\s*-\*-|\bvim?:.*?\b(?:ft|filetype|syntax)=([\w+-]+)')
+MAX_LANGUAGE_MEMO = 16384
+_language_memo = OrderedDict()
+_language_lock = threading.Lock()
+
+def _interpreter_language(command):
+    name = os.path.basename(command).lower()
+    return INTERPRETER_LANGUAGES.get(name) or INTERPRETER_LANGUAGES.get(name.rstrip('0123456789.'), '')
+
+def language_from_name(file_path):
+    name = os.path.basename(file_path).lower()
+    language = FILENAME_LANGUAGES.get(name)
+    if language is not None:
+        return language
+    stem, dot, ext = name.rpartition('.')
+    if not dot:
+        return ''
+    return EXTENSION_LANGUAGES.get('.' + ext) or FILENAME_LANGUAGES.get(stem, '')
+
+def language_from_content(text):
+    head = text[:512]
+    match = _SHEBANG_RE.match(head)
+    if match:
+        command, args = match.group(1), (match.group(2) or '').split()
+        if os.path.basename(command) == 'env':
+            args = [a for a in args if not a.startswith('-')]
+            command = args[0] if args else ''
+        language = _interpreter_language(command)
+        if language:
+            return language
+    for chunk in (head.split('\n', 5)[:5], text[-512:].split('\n')[-5:]):
+        for line in chunk:
+            match = _MODELINE_RE.search(line)
+            if match:
+                mode = next(g for g in match.groups() if g).lower()
+                return EXTENSION_LANGUAGES.get('.' + mode) or INTERPRETER_LANGUAGES.get(mode) or mode
+    return ''
+
+def detect_language(file_path, text=None):
+    memo = _language_memo
+    if text is None:
+        with _language_lock:
+            language = memo.get(file_path)
+            if language is not None:
+                memo.move_to_end(file_path)
+                return language
+    language = language_from_name(file_path)
+    if not language and text:
+        language = language_from_content(text)
+    if language or text is not None:
+        with _language_lock:
+            memo[file_path] = language
+            memo.move_to_end(file_path)
+            while len(memo) > MAX_LANGUAGE_MEMO:
+                memo.popitem(last=False)
+    return language
+
+def register_languages(mapping):
+    for key, language in mapping.items():
+        key = key.strip().lower()
+        if key.startswith('#!'):
+            INTERPRETER_LANGUAGES[key[2:].strip()] = language
+        elif key.startswith('*.'):
+            EXTENSION_LANGUAGES[key[1:]] = language
+        elif key.startswith('.') and key not in FILENAME_LANGUAGES and '.' not in key[1:]:
+            EXTENSION_LANGUAGES[key] = language
+        else:
+            FILENAME_LANGUAGES[key] = language
+    with _language_lock:
+        _language_memo.clear()
+
+def parse_language_overrides(text):
+    mapping = {}
+    for item in split_patterns(text):
+        key, sep, language = item.partition('=')
+        if sep and key.strip():
+            mapping[key.strip()] = language.strip()
+    return mapping
+
+def format_size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+def estimate_tokens(text):
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+def format_tokens(count):
+    if count < 1000:
+        return str(count)
+    if count < 1000 * 1000:
+        return f"{count / 1000:.1f}k"
+    return f"{count / (1000 * 1000):.1f}M"
+
+def _fit_length(text, room):
+    low, high = min(len(text), 1), len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) < room:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def _split_block(text, budget):
+    lines = text.split('\n')
+    fenced = len(lines) >= 4 and lines[-2] and not lines[-1] and lines[1].startswith(lines[-2])
+    head, body, tail = (lines[:2], lines[2:-2], lines[-2:]) if fenced else (lines[:1], lines[1:], [])
+    room = max(1, budget - estimate_tokens('\n'.join(head + tail)) - 8)
+    chunks, chunk, used = [], [], 0
+    for line in body:
+        start = 0
+        while True:
+            window = line[start:start + room * 4]
+            piece = window[:_fit_length(window, room)]
+            start += len(piece)
+            cost = estimate_tokens(piece) + 1
+            if chunk and used + cost > room:
+                chunks.append(chunk)
+                chunk, used = [], 0
+            chunk.append(piece)
+            used += cost
+            if start >= len(line):
+                break
+    chunks.append(chunk)
+    return [
+        '\n'.join([f"{head[0]} (part {number}/{len(chunks)})", *head[1:], *chunk, *tail])
+        for number, chunk in enumerate(chunks, 1)
+    ]
+
+def split_parts(blocks, budget, tokens=None):
+    parts = []
+    pieces, used = [], 0
+    for position, block in enumerate(blocks):
+        cost = (tokens[position] if tokens is not None else estimate_tokens(block)) + 1
+        if cost <= budget:
+            chunks = [(block, cost)]
+        else:
+            chunks = [(piece, estimate_tokens(piece) + 1) for piece in _split_block(block, budget)]
+        for piece, cost in chunks:
+            if pieces and used + cost > budget:
+                parts.append((pieces, used))
+                pieces, used = [], 0
+            pieces.append(piece)
+            used += cost
+    if pieces:
+        parts.append((pieces, used))
+    return parts
+
+TIMING_ENV = 'FILE_CONCATENATOR_TIMING'
+PROFILE_ENV = 'FILE_CONCATENATOR_PROFILE'
+PHASES = ('walk', 'read', 'decode', 'hash', 'transform', 'format', 'render', 'write')
+
+class PhaseTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = {}
+            self.files = {}
+
+    def add(self, phase, seconds, num_bytes=0, path=None):
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0.0, 0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+            entry[2] += num_bytes
+            if path is not None:
+                record = self.files.setdefault(path, [0.0, 0])
+                record[0] += seconds
+                record[1] = max(record[1], num_bytes)
+
+    def active(self, phase):
+        return phase in getattr(self._active, 'phases', ())
+
+    def measure(self, phase, num_bytes=0, path=None):
+        timer = self
+
+        class _Measure:
+            def __enter__(self):
+                timer._active.phases = getattr(timer._active, 'phases', frozenset()) | {phase}
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.add(phase, time.perf_counter() - self.start, num_bytes, path)
+                timer._active.phases = timer._active.phases - {phase}
+
+        return _Measure()
+
+    def summary(self):
+        with self._lock:
+            phases = dict(self.phases)
+        parts = []
+        for phase in PHASES + tuple(sorted(set(phases) - set(PHASES))):
+            if phase in phases:
+                seconds, _, num_bytes = phases[phase]
+                parts.append(f"{phase} {seconds * 1000:.0f} ms" + (f" ({format_size(num_bytes)})" if num_bytes else ""))
+        return ', '.join(parts)
+
+    def slowest(self, count=5):
+        with self._lock:
+            files = sorted(self.files.items(), key=lambda item: item[1][0], reverse=True)[:count]
+        return [(path, seconds, num_bytes) for path, (seconds, num_bytes) in files]
+
+_timer = PhaseTimer() if os.environ.get(TIMING_ENV) else None
+
+def enable_timing(enabled=True):
+    global _timer
+    _timer = PhaseTimer() if enabled else None
+    return _timer
+
+def phase_timer():
+    return _timer
+
+def start_profile(path):
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(path)
+    return stop
+
+DEFAULT_PRUNED_DIRS = frozenset({
+    '.git', '.hg', '.svn', 'node_modules', 'venv', '.venv', 'env', '__pycache__',
+    '.tox', '.nox', '.mypy_cache', '.pytest_cache', '.ruff_cache', '.idea', '.vs',
+    'build', 'dist', 'target', '.eggs'
+})
+
+def split_patterns(text):
+    return tuple(p.strip() for p in re.split(r'[;,]', text or '') if p.strip())
+
+def _glob_to_regex(pattern):
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+            continue
+        if c == '*':
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[' and pattern.find(']', i + 1) != -1:
+            j = pattern.find(']', i + 1)
+            body = pattern[i + 1:j].replace('\\', '\\\\')
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            out.append(f'[{body}]')
+            i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+class GitIgnore:
+    def __init__(self, base_dir, lines):
+        self.base_dir = base_dir
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            anchored = '/' in line
+            body = _glob_to_regex(line.lstrip('/'))
+            regex = re.compile(body if anchored else f'(?:.*/)?{body}')
+            self.rules.append((regex, negate, dir_only))
+
+    @classmethod
+    def load(cls, directory):
+        try:
+            with open(os.path.join(directory, '.gitignore'), 'r', encoding='utf-8', errors='replace') as f:
+                return cls(directory, f.readlines())
+        except OSError:
+            return None
+
+    def match(self, path, is_dir):
+        rel_path = os.path.relpath(path, self.base_dir).replace(os.sep, '/')
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(rel_path):
+                result = not negate
+        return result
+
+def _is_ignored(ignores, path, is_dir):
+    for ignore in reversed(ignores):
+        result = ignore.match(path, is_dir)
+        if result is not None:
+            return result
+    return False
+
+def _ancestor_ignores(root):
+    ignores = []
+    directory = os.path.dirname(root)
+    while directory and not os.path.isdir(os.path.join(directory, '.git')):
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return []
+        directory = parent
+    if not directory:
+        return []
+    repo_root = directory
+    directory = os.path.dirname(root)
+    while True:
+        ignore = GitIgnore.load(directory)
+        if ignore is not None:
+            ignores.insert(0, ignore)
+        if directory == repo_root:
+            return ignores
+        directory = os.path.dirname(directory)
+
+def _matches_any(patterns, name, rel_path):
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel_path, p) for p in patterns)
+
+def iter_tree_files(root, include=(), exclude=(), pruned_dirs=DEFAULT_PRUNED_DIRS, use_gitignore=True):
+    root = os.path.abspath(root)
+    ignores = _ancestor_ignores(root) if use_gitignore else []
+    stack = [(root, ignores)]
+    while stack:
+        directory, ignores = stack.pop()
+        if use_gitignore:
+            ignore = GitIgnore.load(directory)
+            if ignore is not None:
+                ignores = ignores + [ignore]
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name.lower())
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in pruned_dirs or _matches_any(exclude, entry.name, rel_path):
+                    continue
+                if ignores and _is_ignored(ignores, entry.path, True):
+                    continue
+                subdirs.append(entry.path)
+            elif is_file:
+                if exclude and _matches_any(exclude, entry.name, rel_path):
+                    continue
+                if include and not _matches_any(include, entry.name, rel_path):
+                    continue
+                if ignores and _is_ignored(ignores, entry.path, False):
+                    continue
+                yield entry.path
+        stack.extend((subdir, ignores) for subdir in reversed(subdirs))
+
+ARCHIVE_SUFFIXES = ('.zip', '.jar', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+ARCHIVE_ERRORS = (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError)
+MAX_ARCHIVE_LISTINGS = 16
+ARCHIVE_BUFFER_BYTES = 32 * 1024 * 1024
+
+def is_archive_name(name):
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+class ArchiveListing:
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.files = {}
+        self.directories = {'': set()}
+        self.is_zip = zipfile.is_zipfile(path)
+        self._zip = None
+        self._tar = None
+        self._lock = threading.Lock()
+        self._offsets = []
+        self._buffered = {}
+        self._buffered_bytes = 0
+        if self.is_zip:
+            self._zip = zipfile.ZipFile(path)
+            for info in self._zip.infolist():
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                self._add(info.filename, info.is_dir(), info.file_size, mtime, info)
+        else:
+            self._tar = tarfile.open(path)
+            for info in self._tar:
+                if info.isdir() or info.isfile():
+                    self._add(info.name, info.isdir(), info.size, info.mtime, info)
+            self._offsets = sorted((info.offset_data, member) for member, (_, _, info) in self.files.items())
+
+    def _add(self, name, is_dir, size, mtime, info):
+        parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+        if not parts or '..' in parts:
+            return
+        for depth in range(1, len(parts) + 1):
+            member = '/'.join(parts[:depth])
+            self.directories['/'.join(parts[:depth - 1])].add(parts[depth - 1])
+            if depth < len(parts) or is_dir:
+                self.directories.setdefault(member, set())
+        if not is_dir:
+            self.files[member] = (size, mtime, info)
+
+    def entries(self, directory=''):
+        entries = []
+        for name in self.directories.get(directory, ()):
+            member = f"{directory}/{name}" if directory else name
+            size, mtime, _ = self.files.get(member, (0, 0.0, None))
+            entries.append((name, member in self.directories, size, mtime))
+        return entries
+
+    @contextmanager
+    def open(self, member):
+        info = self.files[member][2]
+        if self.is_zip:
+            with self._lock:
+                if self._zip is None:
+                    self._zip = zipfile.ZipFile(self.path)
+                archive = self._zip
+            with archive.open(info) as f:
+                yield f
+            return
+        with self._lock:
+            data = self._buffered.pop(member, None)
+            if data is not None:
+                self._buffered_bytes -= len(data)
+                yield io.BytesIO(data)
+                return
+            if self._tar is None:
+                self._tar = tarfile.open(self.path)
+            self._skip_to(info.offset_data)
+            yield self._tar.extractfile(info)
+
+    def _skip_to(self, offset):
+        # Compressed tars only seek forward cheaply; buffer the members passed over so a walk that
+        # visits them later is served from memory instead of decompressing the stream again.
+        position = self._tar.fileobj.tell()
+        if offset <= position or self.path.lower().endswith('.tar'):
+            return
+        start = bisect.bisect_left(self._offsets, (position, ''))
+        for skipped_offset, member in self._offsets[start:]:
+            if skipped_offset >= offset:
+                break
+            size = self.files[member][0]
+            if member in self._buffered or self._buffered_bytes + size > ARCHIVE_BUFFER_BYTES:
+                continue
+            self._buffered[member] = self._tar.extractfile(self.files[member][2]).read()
+            self._buffered_bytes += size
+
+    def close(self):
+        with self._lock:
+            for archive in (self._zip, self._tar):
+                if archive is not None:
+                    archive.close()
+            self._zip = self._tar = None
+            self._buffered.clear()
+            self._buffered_bytes = 0
+
+_archive_listings = OrderedDict()
+_archive_lock = threading.Lock()
+
+def archive_listing(path):
+    st = os.stat(path)
+    key = (st.st_size, st.st_mtime_ns)
+    with _archive_lock:
+        listing = _archive_listings.get(path)
+        if listing is not None and listing.key == key:
+            _archive_listings.move_to_end(path)
+            return listing
+    listing = ArchiveListing(path, key)
+    with _archive_lock:
+        evicted = [_archive_listings.pop(path)] if path in _archive_listings else []
+        _archive_listings[path] = listing
+        while len(_archive_listings) > MAX_ARCHIVE_LISTINGS:
+            evicted.append(_archive_listings.popitem(last=False)[1])
+    for previous in evicted:
+        previous.close()
+    return listing
+
+def split_archive_path(path):
+    current = os.path.abspath(path)
+    members = []
+    while True:
+        if os.path.isfile(current):
+            return (current, '/'.join(reversed(members))) if is_archive_name(current) else None
+        if os.path.exists(current):
+            return None
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        members.append(os.path.basename(current))
+        current = parent
+
+def archive_entry(path):
+    split = split_archive_path(path)
+    if split is None:
+        return None
+    try:
+        listing = archive_listing(split[0])
+    except ARCHIVE_ERRORS:
+        return None
+    if split[1] in listing.directories:
+        return True, 0, 0.0
+    if split[1] in listing.files:
+        size, mtime, _ = listing.files[split[1]]
+        return False, size, mtime
+    return None
+
+def list_archive_directory(path):
+    split = split_archive_path(path)
+    if split is None:
+        return []
+    try:
+        return archive_listing(split[0]).entries(split[1])
+    except ARCHIVE_ERRORS:
+        return []
+
+def iter_archive_files(path, include=(), exclude=(), pruned_dirs=DEFAULT_PRUNED_DIRS, use_gitignore=True):
+    split = split_archive_path(path)
+    if split is None:
+        return
+    archive, prefix = split
+    try:
+        listing = archive_listing(archive)
+    except ARCHIVE_ERRORS:
+        return
+    if prefix in listing.files:
+        yield os.path.join(archive, *prefix.split('/'))
+        return
+    stack = [prefix] if prefix in listing.directories else []
+    while stack:
+        directory = stack.pop()
+        subdirs = []
+        for name in sorted(listing.directories[directory], key=str.lower):
+            member = f"{directory}/{name}" if directory else name
+            rel_path = member[len(prefix) + 1:] if prefix else member
+            if member in listing.directories:
+                if name in pruned_dirs or _matches_any(exclude, name, rel_path):
+                    continue
+                subdirs.append(member)
+            else:
+                if exclude and _matches_any(exclude, name, rel_path):
+                    continue
+                if include and not _matches_any(include, name, rel_path):
+                    continue
+                yield os.path.join(archive, *member.split('/'))
+        stack.extend(reversed(subdirs))
+
+def path_exists(path):
+    return os.path.exists(path) or archive_entry(path) is not None
+
+class ContentCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.backing = None
+        self.backing_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, mtime_ns, size):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == mtime_ns and entry[1] == size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+            backing = self.backing
+        content = backing.get(path, mtime_ns, size) if backing is not None else None
+        if content is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        self.put(path, mtime_ns, size, content)
+        with self._lock:
+            self.backing_hits += 1
+        return content
+
+    def put(self, path, mtime_ns, size, content):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[path] = (mtime_ns, size, content)
+            self.current_bytes += size
+            self._evict()
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'backing_hits': self.backing_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+SNIFF_BYTES = 8192
+MMAP_THRESHOLD = 1024 * 1024
+DEFAULT_MAX_FILE_BYTES = 2 * 1024 * 1024
+EXCERPT_BYTES = 32 * 1024
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+FALLBACK_ENCODINGS = ('cp1252', 'latin-1')
+_TEXT_BYTES = bytes(range(32, 256)) + b'\t\n\x0c\r\x1b\x08'
+
+def sniff_encoding(head):
+    for bom, encoding in BOM_ENCODINGS:
+        if head.startswith(bom):
+            return encoding
+    if b'\0' in head:
+        return None
+    if head and len(head.translate(None, _TEXT_BYTES)) > len(head) * 0.3:
+        return None
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 3:
+            return FALLBACK_ENCODINGS[0]
+    return 'utf-8'
+
+def _decode(data, encoding, errors='strict'):
+    for candidate in (encoding,) + FALLBACK_ENCODINGS:
+        try:
+            text = str(data, candidate, errors)
+            break
+        except UnicodeDecodeError:
+            continue
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text, candidate
+
+def _read_excerpt(f, head, size, encoding, excerpt_bytes):
+    head = (head + f.read(max(excerpt_bytes - len(head), 0)))[:excerpt_bytes]
+    f.seek(max(size - excerpt_bytes, excerpt_bytes))
+    tail = f.read(excerpt_bytes)
+    omitted = size - len(head) - len(tail)
+    head_text, encoding = _decode(head, encoding, 'replace')
+    tail_text, _ = _decode(tail, encoding, 'replace')
+    marker = f"... [{omitted} bytes omitted, file is {format_size(size)}] ..."
+    return f"{head_text}\n{marker}\n{tail_text}", encoding
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class _MemberStat:
+    __slots__ = ('st_size', 'st_mtime', 'st_mtime_ns')
+
+    def __init__(self, size, mtime, mtime_ns):
+        self.st_size = size
+        self.st_mtime = mtime
+        self.st_mtime_ns = mtime_ns
+
+def _finish_read(file_path, data, encoding, st, cache, start, read_done):
+    timer = _timer
+    content, encoding = _decode(data, encoding)
+    decode_done = time.perf_counter() if timer is not None else 0.0
+    digest = _digest(data)
+    if timer is not None:
+        timer.add('read', read_done - start, st.st_size, file_path)
+        timer.add('decode', decode_done - read_done, path=file_path)
+        timer.add('hash', time.perf_counter() - decode_done, path=file_path)
+    if cache is not None:
+        cache.put(file_path, st.st_mtime_ns, st.st_size, (content, encoding, digest))
+    return content, encoding, st, False, digest
+
+def _read_member(file_path, archive, member, cache, max_bytes, excerpt_bytes):
+    timer = _timer
+    start = time.perf_counter() if timer is not None else 0.0
+    listing = archive_listing(archive)
+    if member not in listing.files:
+        raise FileNotFoundError(errno.ENOENT, "No such archive member", file_path)
+    size, mtime, _ = listing.files[member]
+    st = _MemberStat(size, mtime, listing.key[1])
+    if cache is not None:
+        cached = cache.get(file_path, st.st_mtime_ns, st.st_size)
+        if cached is not None:
+            content, encoding, digest = cached
+            return content, encoding, st, False, digest
+    with listing.open(member) as f:
+        head = f.read(SNIFF_BYTES)
+        encoding = sniff_encoding(head)
+        if encoding is None:
+            return None, None, st, False, None
+        if size > max_bytes:
+            content, encoding = _read_excerpt(f, head, size, encoding, min(excerpt_bytes, max_bytes // 2))
+            return content, encoding, st, True, None
+        data = head + f.read()
+    read_done = time.perf_counter() if timer is not None else 0.0
+    return _finish_read(file_path, data, encoding, st, cache, start, read_done)
+
+def _read_file(file_path, cache=None, max_bytes=DEFAULT_MAX_FILE_BYTES, excerpt_bytes=EXCERPT_BYTES):
+    timer = _timer
+    start = time.perf_counter() if timer is not None else 0.0
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        split = split_archive_path(file_path)
+        if split is None or not split[1]:
+            raise
+        return _read_member(file_path, split[0], split[1], cache, max_bytes, excerpt_bytes)
+    if cache is not None:
+        cached = cache.get(file_path, st.st_mtime_ns, st.st_size)
+        if cached is not None:
+            content, encoding, digest = cached
+            return content, encoding, st, False, digest
+    with open(file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        head = f.read(SNIFF_BYTES)
+        encoding = sniff_encoding(head)
+        if encoding is None:
+            return None, None, st, False, None
+        if st.st_size > max_bytes:
+            content, encoding = _read_excerpt(f, head, st.st_size, encoding, min(excerpt_bytes, max_bytes // 2))
+            return content, encoding, st, True, None
+        if st.st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                read_done = time.perf_counter() if timer is not None else 0.0
+                return _finish_read(file_path, mm, encoding, st, cache, start, read_done)
+        data = head + f.read()
+        read_done = time.perf_counter() if timer is not None else 0.0
+    return _finish_read(file_path, data, encoding, st, cache, start, read_done)
+
+class Segment:
+    __slots__ = ('path', 'content', 'language', 'size', 'encoding', 'truncated', 'skipped', 'error', 'reduced',
+                 'digest', 'mtime_ns')
+
+    def __init__(self, path, content='', language='', size=0, encoding=None, truncated=False,
+                 skipped=None, error=None, reduced=None, digest=None, mtime_ns=None):
+        self.path = path
+        self.content = content
+        self.language = language
+        self.size = size
+        self.encoding = encoding
+        self.truncated = truncated
+        self.skipped = skipped
+        self.error = error
+        self.reduced = reduced
+        self.digest = digest
+        self.mtime_ns = mtime_ns
+
+def read_segment(file_path, language=None, cache=None, max_bytes=DEFAULT_MAX_FILE_BYTES,
+                 language_for=detect_language):
+    try:
+        content, encoding, st, truncated, digest = _read_file(file_path, cache, max_bytes)
+        if language is None:
+            language = language_for(file_path, content)
+        if content is None:
+            return Segment(file_path, language=language, size=st.st_size, skipped='binary', mtime_ns=st.st_mtime_ns)
+        return Segment(file_path, content, language, st.st_size, encoding, truncated,
+                       digest=digest, mtime_ns=st.st_mtime_ns)
+    except Exception as e:
+        return Segment(file_path, language=language_for(file_path) if language is None else language, error=str(e))
+
+_STRING_PATTERNS = (r'"(?:\\.|[^"\\\n])*"', r"'(?:\\.|[^'\\\n])*'")
+_SLASH_COMMENT = r'//[^\n]*'
+_BLOCK_COMMENT = r'/\*.*?\*/'
+_HASH_COMMENT = r'(?:^|(?<=[ \t]))#(?!!)[^\n]*'
+_PHP_HASH_COMMENT = r'(?:^|(?<=[ \t]))#(?![!\[])[^\n]*'
+_CSS_URL = r'\burl\((?![ \t]*["\'])[^)\n]*\)'
+_JSX_TEXT = r'(?<![=\-])>[^<>{}]*<(?=[/A-Za-z>])'
+_DASH_COMMENT = r'--[^\n]*'
+_HTML_COMMENT = r'<!--.*?-->'
+
+def _comment_pattern(strings, comments):
+    return re.compile('|'.join(strings + ('(?P<comment>' + '|'.join(comments) + ')',)), re.S | re.M)
+
+_TEMPLATE_STRING = r'`(?:\\.|[^`\\])*`'
+_C_COMMENTS = _comment_pattern(_STRING_PATTERNS + (_TEMPLATE_STRING,), (_SLASH_COMMENT, _BLOCK_COMMENT))
+_REGEX_LITERAL = (
+    r'(?:(?<=[(,=:\[!&|?{};])|^|(?<=\breturn)|(?<=\btypeof))[ \t]*'
+    r'/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*'
+)
+_JS_COMMENTS = _comment_pattern(_STRING_PATTERNS + (_TEMPLATE_STRING, _REGEX_LITERAL), (_SLASH_COMMENT, _BLOCK_COMMENT))
+_JSX_COMMENTS = _comment_pattern(
+    _STRING_PATTERNS + (_TEMPLATE_STRING, _JSX_TEXT, _REGEX_LITERAL), (_SLASH_COMMENT, _BLOCK_COMMENT)
+)
+_HASH_COMMENTS = _comment_pattern(_STRING_PATTERNS, (_HASH_COMMENT,))
+_HTML_COMMENTS = _comment_pattern((), (_HTML_COMMENT,))
+_C_FAMILY = (
+    'c', 'cpp', 'java', 'csharp', 'go', 'rust', 'swift', 'kotlin', 'scala', 'groovy', 'dart', 'objectivec', 'zig',
+    'protobuf'
+)
+_HASH_FAMILY = (
+    'bash', 'zsh', 'fish', 'ruby', 'perl', 'yaml', 'toml', 'r', 'elixir', 'makefile', 'dockerfile', 'cmake', 'awk',
+    'tcl'
+)
+_MARKUP_FAMILY = ('html', 'xml', 'vue', 'svelte', 'markdown')
+COMMENT_PATTERNS = {
+    **dict.fromkeys(_C_FAMILY, _C_COMMENTS),
+    **dict.fromkeys(('javascript', 'typescript'), _JS_COMMENTS),
+    **dict.fromkeys(('jsx', 'tsx'), _JSX_COMMENTS),
+    **dict.fromkeys(
+        ('scss', 'less'), _comment_pattern(_STRING_PATTERNS + (_CSS_URL,), (_SLASH_COMMENT, _BLOCK_COMMENT))
+    ),
+    **dict.fromkeys(_HASH_FAMILY, _HASH_COMMENTS),
+    **dict.fromkeys(_MARKUP_FAMILY, _HTML_COMMENTS),
+    'css': _comment_pattern(_STRING_PATTERNS + (_CSS_URL,), (_BLOCK_COMMENT,)),
+    'php': _comment_pattern(_STRING_PATTERNS, (_SLASH_COMMENT, _BLOCK_COMMENT, _PHP_HASH_COMMENT)),
+    'hcl': _comment_pattern(_STRING_PATTERNS, (_SLASH_COMMENT, _BLOCK_COMMENT, _HASH_COMMENT)),
+    'ps1': _comment_pattern(_STRING_PATTERNS, (r'<#.*?#>', _HASH_COMMENT)),
+    'sql': _comment_pattern(_STRING_PATTERNS, (_DASH_COMMENT, _BLOCK_COMMENT)),
+    'lua': _comment_pattern(_STRING_PATTERNS, (r'--\[\[.*?\]\]', _DASH_COMMENT)),
+    'haskell': _comment_pattern(_STRING_PATTERNS, (r'\{-.*?-\}', _DASH_COMMENT)),
+    'ini': _comment_pattern((), (r'^[ \t]*[;#][^\n]*',)),
+}
+
+def _leading_comment_pattern(line_markers=(), blocks=()):
+    alternatives = [rf'[ \t]*{re.escape(start)}.*?{re.escape(end)}[ \t]*\n?' for start, end in blocks]
+    if line_markers:
+        alternatives.append(rf"(?:[ \t]*(?:{'|'.join(map(re.escape, line_markers))})[^\n]*(?:\n|\Z))+")
+    return re.compile('|'.join(alternatives), re.S)
+
+_C_LEADING = _leading_comment_pattern(('//',), (('/*', '*/'),))
+_HASH_LEADING = _leading_comment_pattern(('#',))
+LEADING_COMMENT_PATTERNS = {
+    **dict.fromkeys(_C_FAMILY + ('javascript', 'jsx', 'typescript', 'tsx', 'scss', 'less'), _C_LEADING),
+    **dict.fromkeys(('python',) + _HASH_FAMILY, _HASH_LEADING),
+    **dict.fromkeys(_MARKUP_FAMILY, _leading_comment_pattern(blocks=(('<!--', '-->'),))),
+    'css': _leading_comment_pattern(blocks=(('/*', '*/'),)),
+    'php': _leading_comment_pattern(('//', '#'), (('/*', '*/'),)),
+    'hcl': _leading_comment_pattern(('//', '#'), (('/*', '*/'),)),
+    'ps1': _leading_comment_pattern(('#',), (('<#', '#>'),)),
+    'sql': _leading_comment_pattern(('--',), (('/*', '*/'),)),
+    'lua': _leading_comment_pattern(('--',), (('--[[', ']]'),)),
+    'haskell': _leading_comment_pattern(('--',), (('{-', '-}'),)),
+    'ini': _leading_comment_pattern((';', '#')),
+}
+_LICENSE_RE = re.compile(r'licen[cs]e|copyright|spdx-license-identifier|\(c\)', re.I)
+
+def _drop_marked_lines(text):
+    lines = []
+    for line in text.split('\n'):
+        if '\0' in line:
+            line = line.replace('\0', '').rstrip()
+            if not line.strip():
+                continue
+        lines.append(line)
+    return '\n'.join(lines)
+
+def _python_removals(text):
+    tokens = list(tokenize.generate_tokens(io.StringIO(text).readline))
+    skip = (tokenize.NL, tokenize.COMMENT)
+    significant = [i for i, token in enumerate(tokens) if token.type not in skip]
+    removals = []
+    for token in tokens:
+        if token.type == tokenize.COMMENT and not (token.start == (1, 0) and token.string.startswith('#!')):
+            removals.append((token.start, token.end, ''))
+    for position, i in enumerate(significant):
+        token = tokens[i]
+        if token.type != tokenize.STRING:
+            continue
+        before = tokens[significant[position - 1]].type if position else tokenize.NEWLINE
+        after = [tokens[j].type for j in significant[position + 1:position + 3]]
+        if before not in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT) or after[:1] != [tokenize.NEWLINE]:
+            continue
+        only_statement = before == tokenize.INDENT and after[1:] in ([tokenize.DEDENT], [tokenize.ENDMARKER])
+        removals.append((token.start, token.end, 'pass' if only_statement else ''))
+    return removals
+
+def _strip_python(text):
+    try:
+        removals = _python_removals(text)
+    except (tokenize.TokenError, SyntaxError):
+        return _drop_marked_lines(_HASH_COMMENTS.sub(_mark_comment, text))
+    offsets = [0]
+    for line in text.split('\n'):
+        offsets.append(offsets[-1] + len(line) + 1)
+    parts = []
+    position = 0
+    for (start_row, start_col), (end_row, end_col), replacement in sorted(removals):
+        start = offsets[start_row - 1] + start_col
+        parts.append(text[position:start])
+        parts.append(replacement or '\0')
+        position = offsets[end_row - 1] + end_col
+    parts.append(text[position:])
+    return _drop_marked_lines(''.join(parts))
+
+def _mark_comment(match):
+    return '\0' if match.group('comment') else match.group()
+
+def strip_comments(text, language=''):
+    if language == 'python':
+        return _strip_python(text)
+    pattern = COMMENT_PATTERNS.get(language)
+    if pattern is None:
+        return text
+    return _drop_marked_lines(pattern.sub(_mark_comment, text))
+
+def drop_license_header(text, language=''):
+    pattern = LEADING_COMMENT_PATTERNS.get(language)
+    if pattern is None:
+        return text
+    start = text.find('\n') + 1 if text.startswith('#!') else 0
+    while start < len(text) and text[start] in ' \t\n':
+        start += 1
+    start = text.rfind('\n', 0, start) + 1
+    match = pattern.match(text, start)
+    if match and match.end() > start and _LICENSE_RE.search(match.group()):
+        return text[:start] + text[match.end():].lstrip('\n')
+    return text
+
+def trim_trailing_whitespace(text, language=''):
+    return re.sub(r'[ \t]+$', '', text, flags=re.M)
+
+def collapse_blank_lines(text, language=''):
+    text = re.sub(r'\n(?:[ \t]*\n){2,}', '\n\n', text)
+    return re.sub(r'\A(?:[ \t]*\n)+|(?<=\n)(?:[ \t]*\n)+\Z', '', text)
+
+TRANSFORMS = OrderedDict([
+    ('license', drop_license_header),
+    ('comments', strip_comments),
+    ('trailing_whitespace', trim_trailing_whitespace),
+    ('blank_lines', collapse_blank_lines),
+])
+TRANSFORM_BATCH_BYTES = 256 * 1024
+PARALLEL_TRANSFORM_BYTES = 1024 * 1024
+
+def count_lines(text):
+    return text.count('\n') + (1 if text and not text.endswith('\n') else 0)
+
+def apply_transforms(text, language, names):
+    for name, transform in TRANSFORMS.items():
+        if name in names:
+            text = transform(text, language)
+    return text
+
+def transform_batch(items, names):
+    results = []
+    for text, language in items:
+        reduced = apply_transforms(text, language, names)
+        stats = (len(text.encode('utf-8')), count_lines(text), len(reduced.encode('utf-8')), count_lines(reduced))
+        results.append((reduced, stats))
+    return results
+
+def transform_executor(max_workers=None):
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+def _transformable(segment):
+    return segment.reduced is None and segment.skipped is None and segment.error is None
+
+def iter_transformed(segments, names, executor=None, cancel_event=None, batch_bytes=TRANSFORM_BATCH_BYTES,
+                     parallel_bytes=PARALLEL_TRANSFORM_BYTES, read_ahead=4):
+    names = tuple(name for name in TRANSFORMS if name in names)
+    if not names:
+        yield from segments
+        return
+    pending = deque()
+    batch = []
+    batch_size = 0
+    seen_bytes = 0
+    timer = _timer
+
+    def flush():
+        items = [(segment.content, segment.language) for segment in batch if _transformable(segment)]
+        pending.append((batch, executor.submit(transform_batch, items, names)))
+
+    def drain():
+        done, future = pending.popleft()
+        start = time.perf_counter() if timer is not None else 0.0
+        results = iter(future.result())
+        if timer is not None:
+            timer.add('transform', time.perf_counter() - start)
+        for segment in done:
+            if _transformable(segment):
+                segment.content, segment.reduced = next(results)
+            yield segment
+
+    try:
+        for segment in segments:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if _transformable(segment):
+                seen_bytes += len(segment.content)
+            if executor is None or (seen_bytes < parallel_bytes and not pending and not batch):
+                if _transformable(segment):
+                    start = time.perf_counter() if timer is not None else 0.0
+                    (segment.content, segment.reduced), = transform_batch([(segment.content, segment.language)], names)
+                    if timer is not None:
+                        timer.add('transform', time.perf_counter() - start, path=segment.path)
+                yield segment
+                continue
+            batch.append(segment)
+            batch_size += len(segment.content or '')
+            if batch_size >= batch_bytes:
+                flush()
+                batch, batch_size = [], 0
+            while len(pending) > read_ahead:
+                yield from drain()
+        if batch:
+            flush()
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            yield from drain()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+def reduction_totals(segments):
+    totals = [0, 0, 0, 0]
+    for segment in segments:
+        if segment.reduced is not None:
+            for i, value in enumerate(segment.reduced):
+                totals[i] += value
+    return tuple(totals)
+
+def format_reduction(totals):
+    bytes_before, lines_before, bytes_after, lines_after = totals
+    return (f"reduced {format_size(bytes_before)} -> {format_size(bytes_after)}, "
+            f"{lines_before} -> {lines_after} lines")
+
+def render_segment(segment, display_path, header_format="# File: {path}", fence="```"):
+    if segment.skipped is not None:
+        return None
+    if segment.error is not None:
+        return f"# Error reading {display_path}: {segment.error}"
+    language = segment.language
+    return '\n'.join([
+        header_format.format(path=display_path),
+        f"{fence}{language}" if language else "",
+        segment.content,
+        fence if language else "",
+        ""
+    ])
+
+def duplicate_key(segment):
+    content = segment.content
+    if segment.digest is None or segment.skipped is not None or not content or content.isspace():
+        return None
+    return segment.digest
+
+def render_duplicate(display_path, original_display_path, header_format="# File: {path}"):
+    return f"{header_format.format(path=display_path)}\n(identical to {original_display_path})\n"
+
+def render_change(segment, display_path, previous, header_format="# File: {path}", fence="```"):
+    if previous is None or segment.skipped is not None or segment.error is not None:
+        return render_segment(segment, display_path, header_format, fence)
+    diff = list(difflib.unified_diff(previous.splitlines(), segment.content.splitlines(),
+                                     f"a/{display_path}", f"b/{display_path}", lineterm=''))
+    if not diff:
+        return render_segment(segment, display_path, header_format, fence)
+    return '\n'.join([header_format.format(path=display_path), f"{fence}diff", *diff, fence, ""])
+
+def render_deleted_summary(paths, display_path=os.path.abspath):
+    if not paths:
+        return ''
+    lines = [f"# Deleted {len(paths)} file(s) since snapshot:"]
+    lines.extend(f"# - {display_path(path)}" for path in paths)
+    return '\n'.join(lines)
+
+def render_skipped_summary(segments, display_path=os.path.abspath):
+    skipped = [segment for segment in segments if segment.skipped is not None]
+    if not skipped:
+        return ''
+    lines = [f"# Skipped {len(skipped)} file(s):"]
+    lines.extend(f"# - {display_path(s.path)} ({s.skipped}, {format_size(s.size)})" for s in skipped)
+    return '\n'.join(lines)
+
+def walk_order_key(root, path):
+    if path == root:
+        return ()
+    parts = os.path.relpath(path, root).split(os.sep)
+    return tuple((1, part.lower()) for part in parts[:-1]) + ((0, parts[-1].lower()),)
+
+def iter_selection(entries, walk_options=None, cancel_event=None):
+    walk_options = walk_options or {}
+    seen = set()
+    timer = _timer
+    for entry in entries:
+        entry = os.path.abspath(entry)
+        if os.path.isdir(entry):
+            paths = iter(iter_tree_files(entry, **walk_options))
+        elif (is_archive_name(entry) or not os.path.exists(entry)) and split_archive_path(entry) is not None:
+            paths = iter(iter_archive_files(entry, **walk_options))
+        else:
+            paths = iter((entry,))
+        while True:
+            start = time.perf_counter() if timer is not None else 0.0
+            path = next(paths, None)
+            if path is None:
+                break
+            if timer is not None:
+                timer.add('walk', time.perf_counter() - start)
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if path not in seen:
+                seen.add(path)
+                yield path
+
+def iter_segments(paths, executor=None, cache=None, language_for=detect_language,
+                  read_ahead=64, cancel_event=None, max_file_bytes=DEFAULT_MAX_FILE_BYTES, known=None):
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(thread_name_prefix="concat-read")
+    paths = iter(paths)
+    pending = deque()
+
+    def submit_next():
+        path = next(paths, None)
+        if path is None:
+            return
+        if known is not None and path in known:
+            future = Future()
+            future.set_result(known[path])
+            pending.append(future)
+        else:
+            pending.append(executor.submit(read_segment, path, None, cache, max_file_bytes, language_for))
+
+    try:
+        for _ in range(read_ahead):
+            submit_next()
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            segment = pending.popleft().result()
+            submit_next()
+            yield segment
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def compile_search(query, regex=False):
+    flags = re.MULTILINE if any(c.isupper() for c in query) else re.MULTILINE | re.IGNORECASE
+    return re.compile(query if regex else re.escape(query), flags)
+
+SEARCH_CHUNK_CHARS = 1024 * 1024
+
+def _search_text(content, pattern, max_matches, max_lines, count, lines, line_number):
+    last = 0
+    for match in pattern.finditer(content):
+        count += 1
+        if len(lines) < max_lines:
+            position = match.start()
+            line_number += content.count('\n', last, position)
+            last = position
+            if not lines or lines[-1][0] != line_number:
+                start = content.rfind('\n', 0, position) + 1
+                end = content.find('\n', position)
+                lines.append((line_number, content[start:end if end >= 0 else len(content)].strip()[:200]))
+        if count >= max_matches:
+            break
+    return count
+
+def search_segment(segment, pattern, max_matches=1000, max_lines=5):
+    if segment.skipped is not None or segment.error is not None:
+        return None
+    lines = []
+    count = _search_text(segment.content, pattern, max_matches, max_lines, 0, lines, 1)
+    return (count, lines) if count else None
+
+@contextmanager
+def _open_source(path):
+    split = None if os.path.isfile(path) else split_archive_path(path)
+    if split is None or not split[1]:
+        with open(path, 'rb') as f:
+            yield f
+    else:
+        with archive_listing(split[0]).open(split[1]) as f:
+            yield f
+
+def search_file(path, encoding, pattern, max_matches=1000, max_lines=5, chunk_chars=SEARCH_CHUNK_CHARS):
+    count = 0
+    lines = []
+    line_number = 1
+    with _open_source(path) as f:
+        text = io.TextIOWrapper(f, encoding, 'replace')
+        while count < max_matches:
+            chunk = ''.join(text.readlines(chunk_chars))
+            if not chunk:
+                break
+            count = _search_text(chunk, pattern, max_matches, max_lines, count, lines, line_number)
+            line_number += chunk.count('\n')
+    return (count, lines) if count else None
+
+def iter_search(entries, pattern, walk_options=None, executor=None, cache=None, cancel_event=None,
+                read_ahead=64, max_file_bytes=DEFAULT_MAX_FILE_BYTES, max_matches=1000):
+    paths = iter_selection(entries, walk_options, cancel_event)
+    for segment in iter_segments(paths, executor, cache, read_ahead=read_ahead, cancel_event=cancel_event,
+                                 max_file_bytes=max_file_bytes):
+        result = search_segment(segment, pattern, max_matches)
+        if segment.truncated:
+            try:
+                result = search_file(segment.path, segment.encoding, pattern, max_matches)
+            except ARCHIVE_ERRORS:
+                pass
+        yield segment.path, result
+
+def _original_lines(segment):
+    if segment.reduced is not None:
+        return segment.reduced[1]
+    if segment.skipped is None and not segment.truncated:
+        return count_lines(segment.content)
+    return None
+
+class ProjectIndex:
+    VERSION = 2
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+        "mtime_ns INTEGER NOT NULL, digest TEXT, language TEXT, lines INTEGER, encoding TEXT, content BLOB)"
+    )
+
+    def __init__(self, root, index_dir):
+        self.root = os.path.abspath(root)
+        os.makedirs(index_dir, exist_ok=True)
+        self.db_path = self.path_for(self.root, index_dir)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            self._db.execute("DROP TABLE IF EXISTS files")
+            self._db.execute(f"PRAGMA user_version={self.VERSION}")
+        self._db.execute(self.SCHEMA)
+        self._db.commit()
+        self.closed = False
+
+    @staticmethod
+    def path_for(root, index_dir):
+        key = _digest(os.path.normcase(os.path.abspath(root)).encode('utf-8'))
+        return os.path.join(index_dir, f"{key}.sqlite")
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._db.close()
+
+    def _range(self, prefix):
+        prefix = os.path.join(prefix, '')
+        return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+    def totals(self, entries=None):
+        files = size = lines = 0
+        with self._lock:
+            for entry in [] if self.closed else [self.root] if entries is None else entries:
+                if os.path.isdir(entry):
+                    row = self._db.execute(
+                        "SELECT COUNT(*), SUM(size), SUM(lines) FROM files WHERE path >= ? AND path < ?",
+                        self._range(entry)
+                    ).fetchone()
+                else:
+                    row = self._db.execute("SELECT 1, size, lines FROM files WHERE path = ?", (entry,)).fetchone()
+                if row:
+                    files += row[0] or 0
+                    size += row[1] or 0
+                    lines += row[2] or 0
+        return files, size, lines
+
+    def entry(self, path):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, digest, language, lines FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        return dict(zip(('size', 'mtime_ns', 'digest', 'language', 'lines'), row)) if row else None
+
+    def get(self, path, mtime_ns, size):
+        with self._lock:
+            if self.closed:
+                return None
+            row = self._db.execute(
+                "SELECT content, encoding, digest FROM files "
+                "WHERE path = ? AND mtime_ns = ? AND size = ? AND content IS NOT NULL",
+                (path, mtime_ns, size)
+            ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8', 'surrogatepass'), row[1], row[2]
+
+    def record(self, segments):
+        root = os.path.join(self.root, '')
+        rows = []
+        for s in segments:
+            if s.error is not None or s.mtime_ns is None or not s.path.startswith(root):
+                continue
+            cacheable = s.skipped is None and s.reduced is None and s.digest is not None
+            with self._lock:
+                if self.closed:
+                    return 0
+                current = self._db.execute(
+                    "SELECT content IS NOT NULL FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                    (s.path, s.size, s.mtime_ns)
+                ).fetchone()
+            if current is not None and (current[0] or not cacheable):
+                continue
+            content = zlib.compress(s.content.encode('utf-8', 'surrogatepass'), 1) if cacheable else None
+            rows.append((s.path, s.size, s.mtime_ns, s.digest, s.language, _original_lines(s), s.encoding, content))
+        with self._lock:
+            if rows and not self.closed:
+                self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._db.commit()
+        return len(rows)
+
+    def update(self, entries=None, walk_options=None, cancel_event=None, executor=None, cache=None,
+               max_file_bytes=DEFAULT_MAX_FILE_BYTES, batch=512):
+        stats = {'files': 0, 'added': 0, 'changed': 0, 'removed': 0}
+        with self._lock:
+            if self.closed:
+                return stats
+            known = {path: (size, mtime_ns) for path, size, mtime_ns in
+                     self._db.execute("SELECT path, size, mtime_ns FROM files")}
+        if entries is None:
+            paths = list(known)
+        else:
+            entries = [os.path.abspath(entry) for entry in entries]
+            paths = iter_selection(entries, walk_options, cancel_event)
+        changed = []
+
+        def stale():
+            for path in paths:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                stats['files'] += 1
+                previous = known.pop(path, None)
+                if previous == (st.st_size, st.st_mtime_ns):
+                    continue
+                stats['added' if previous is None else 'changed'] += 1
+                yield path
+
+        for segment in iter_segments(stale(), executor, cache, cancel_event=cancel_event,
+                                     max_file_bytes=max_file_bytes):
+            changed.append(segment)
+            if len(changed) >= batch:
+                self.record(changed)
+                changed = []
+        self.record(changed)
+        if cancel_event is not None and cancel_event.is_set():
+            return stats
+        if entries is not None:
+            prefixes = tuple(os.path.join(entry, '') for entry in entries)
+            known = [path for path in known if path in entries or path.startswith(prefixes)]
+        stats['removed'] = len(known)
+        with self._lock:
+            if known and not self.closed:
+                self._db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known])
+                self._db.commit()
+        return stats
+
+class Snapshot:
+    VERSION = 1
+
+    def __init__(self, files=None, created=None):
+        self.files = files if files is not None else {}
+        self.created = time.time() if created is None else created
+
+    def __len__(self):
+        return len(self.files)
+
+    @staticmethod
+    def path_for(root, snapshot_dir):
+        key = _digest(os.path.normcase(os.path.abspath(root)).encode('utf-8'))
+        return os.path.join(snapshot_dir, f"{key}.json.gz")
+
+    @classmethod
+    def from_segments(cls, segments):
+        snapshot = cls()
+        for segment in segments:
+            snapshot.add(segment)
+        return snapshot
+
+    def add(self, segment):
+        if segment.error is None:
+            self.files[segment.path] = (segment.digest, segment.content)
+
+    def changed(self, segment):
+        previous = self.files.get(segment.path)
+        if previous is None:
+            return True
+        if previous[0] is not None and segment.digest is not None:
+            return previous[0] != segment.digest
+        return previous[1] != segment.content
+
+    def previous(self, segment):
+        previous = self.files.get(segment.path)
+        return previous[1] if previous is not None else None
+
+    def deleted(self, entries=None):
+        prefixes = None if entries is None else tuple(os.path.join(entry, '') for entry in entries)
+        return sorted(
+            path for path in self.files
+            if (prefixes is None or path in entries or path.startswith(prefixes)) and not path_exists(path)
+        )
+
+    def save(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        data = {'version': self.VERSION, 'created': self.created, 'files': self.files}
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported snapshot version: {data.get('version')}")
+        return cls({path: tuple(entry) for path, entry in data['files'].items()}, data['created'])
+
+def relative_display_path(root):
+    def display_path(path):
+        return os.path.relpath(path, root) if root else os.path.abspath(path)
+    return display_path
+
+def iter_rendered(segments, display_path=os.path.abspath, header_format="# File: {path}", fence="```"):
+    for segment in segments:
+        text = render_segment(segment, display_path(segment.path), header_format, fence)
+        if text is not None:
+            yield text
+
+def concatenate(entries, out, walk_options=None, display_path=os.path.abspath,
+                header_format="# File: {path}", fence="```", max_workers=None,
+                max_file_bytes=DEFAULT_MAX_FILE_BYTES, transforms=(), deduplicate=True,
+                snapshot=None, diff=False, new_snapshot=None):
+    stats = {'files': 0, 'skipped': 0, 'truncated': 0, 'duplicates': 0, 'bytes': 0, 'reduced': (0, 0, 0, 0),
+             'unchanged': 0, 'deleted': 0, 'tokens': 0}
+    entries = [os.path.abspath(entry) for entry in entries]
+    skipped = []
+    originals = {}
+    transform_pool = transform_executor(max_workers) if transforms else None
+    timer = _timer
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="concat-read") as executor:
+        paths = iter_selection(entries, walk_options)
+        segments = iter_segments(paths, executor, max_file_bytes=max_file_bytes)
+        for segment in iter_transformed(segments, transforms, transform_pool):
+            if new_snapshot is not None:
+                new_snapshot.add(segment)
+            if snapshot is not None and not snapshot.changed(segment):
+                stats['unchanged'] += 1
+                continue
+            start = time.perf_counter() if timer is not None else 0.0
+            key = duplicate_key(segment) if deduplicate else None
+            original = originals.setdefault(key, segment.path) if key is not None else segment.path
+            if original != segment.path:
+                text = render_duplicate(display_path(segment.path), display_path(original), header_format)
+                stats['duplicates'] += 1
+            elif snapshot is not None and diff:
+                text = render_change(segment, display_path(segment.path), snapshot.previous(segment),
+                                     header_format, fence)
+            else:
+                text = render_segment(segment, display_path(segment.path), header_format, fence)
+            if text is None:
+                skipped.append(segment)
+                continue
+            if timer is not None:
+                formatted = time.perf_counter()
+                timer.add('format', formatted - start, path=segment.path)
+            if stats['files']:
+                out.write('\n')
+            out.write(text)
+            if timer is not None:
+                timer.add('write', time.perf_counter() - formatted, len(text))
+            stats['files'] += 1
+            stats['tokens'] += estimate_tokens(text)
+            stats['truncated'] += segment.truncated
+            stats['bytes'] += segment.size
+            if segment.reduced is not None:
+                stats['reduced'] = tuple(a + b for a, b in zip(stats['reduced'], segment.reduced))
+    if transform_pool is not None:
+        transform_pool.shutdown()
+    if skipped:
+        out.write('\n' + render_skipped_summary(skipped, display_path) + '\n')
+        stats['skipped'] = len(skipped)
+    deleted = snapshot.deleted(entries) if snapshot is not None else []
+    if deleted:
+        out.write('\n' + render_deleted_summary(deleted, display_path) + '\n')
+        stats['deleted'] = len(deleted)
+    return stats
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="file_concatenator.py --headless",
+        description="Concatenate files and folders into a single fenced document without starting the GUI."
+    )
+    parser.add_argument('paths', nargs='+', help="Files and folders to concatenate")
+    parser.add_argument('-o', '--output', help="Output file (defaults to stdout)")
+    parser.add_argument('--relative-to', metavar='DIR', help="Show paths relative to DIR instead of absolute paths")
+    parser.add_argument('--include', default='', help="Glob patterns to include from folders, separated by ';'")
+    parser.add_argument('--exclude', default='', help="Glob patterns to exclude from folders, separated by ';'")
+    parser.add_argument('--no-gitignore', action='store_true', help="Do not honour .gitignore files")
+    parser.add_argument('--header-format', default="# File: {path}", help="Header line template")
+    parser.add_argument('--fence', default="```", help="Code fence marker")
+    parser.add_argument('--workers', type=int, default=None, help="Number of reader threads")
+    parser.add_argument('--max-file-mb', type=float, default=DEFAULT_MAX_FILE_BYTES / (1024 * 1024),
+                        help="Files larger than this are truncated to a head/tail excerpt")
+    parser.add_argument('--language', action='append', default=[], metavar='KEY=LANG',
+                        help="Map an extension (.vue), file name (Justfile) or interpreter (#!deno) to a fence language")
+    parser.add_argument('--reduce', action='append', default=[], choices=list(TRANSFORMS),
+                        help="Apply a content reduction before rendering; may be repeated")
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help="Repeat the body of files whose content matches an earlier file")
+    parser.add_argument('--since', metavar='SNAPSHOT',
+                        help="Only write files added or changed since SNAPSHOT, followed by a list of deleted files")
+    parser.add_argument('--diff', action='store_true',
+                        help="With --since, write changed files as unified diffs against the snapshot")
+    parser.add_argument('--save-snapshot', metavar='SNAPSHOT',
+                        help="Save the hashes and contents of the selected files to SNAPSHOT")
+    parser.add_argument('--timing', action='store_true', default=bool(os.environ.get(TIMING_ENV)),
+                        help=f"Print per-phase timings and the slowest files to stderr (or set {TIMING_ENV}=1)")
+    parser.add_argument('--profile', metavar='FILE', default=os.environ.get(PROFILE_ENV),
+                        help=f"Write a cProfile dump of the run to FILE (or set {PROFILE_ENV})")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    register_languages(parse_language_overrides(';'.join(args.language)))
+    timer = enable_timing(args.timing)
+    stop_profile = start_profile(args.profile) if args.profile else None
+    walk_options = {
+        'include': split_patterns(args.include),
+        'exclude': split_patterns(args.exclude),
+        'use_gitignore': not args.no_gitignore,
+    }
+    display_path = relative_display_path(args.relative_to)
+    snapshot = Snapshot.load(args.since) if args.since else None
+    new_snapshot = Snapshot() if args.save_snapshot else None
+    if args.output:
+        out = open(args.output, 'w', encoding='utf-8', newline='')
+    else:
+        out = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='', write_through=True)
+    try:
+        stats = concatenate(args.paths, out, walk_options, display_path, args.header_format, args.fence,
+                            args.workers, int(args.max_file_mb * 1024 * 1024), args.reduce,
+                            not args.keep_duplicates, snapshot, args.diff, new_snapshot)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.detach()
+        if stop_profile is not None:
+            stop_profile()
+    print(f"Concatenated {stats['files']} file(s), {format_size(stats['bytes'])}, "
+          f"~{format_tokens(stats['tokens'])} tokens; "
+          f"skipped {stats['skipped']}, truncated {stats['truncated']}, duplicates {stats['duplicates']}"
+          + (f"; {format_reduction(stats['reduced'])}" if args.reduce else "")
+          + (f"; unchanged {stats['unchanged']}, deleted {stats['deleted']}" if snapshot is not None else ""),
+          file=sys.stderr)
+    if new_snapshot is not None:
+        new_snapshot.save(args.save_snapshot)
+    if timer is not None:
+        print(f"Timing: {timer.summary()}", file=sys.stderr)
+        for path, seconds, num_bytes in timer.slowest():
+            print(f"  {seconds * 1000:8.1f} ms  {format_size(num_bytes):>9}  {path}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,22 @@
+import pytest
+
+@pytest.fixture
+def project_tree(tmp_path):
+    files = {
+        '.gitignore': "*.log\n/generated/\n!keep.log\n",
+        'main.py': "print('main')",
+        'keep.log': "kept",
+        'debug.log': "ignored",
+        'pkg/module.py': "VALUE = 1",
+        'pkg/notes.md': "# Notes",
+        'pkg/.gitignore': "secret.py\n",
+        'pkg/secret.py': "TOKEN = 'x'",
+        'generated/out.py': "generated",
+        'node_modules/lib/index.js': "module.exports = {}",
+        '.git/HEAD': "ref: refs/heads/main",
+    }
+    for rel_path, content in files.items():
+        file_path = tmp_path / rel_path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content, encoding='utf-8')
+    return tmp_path
@@ -1,13 +1,247 @@
-import sys, os
-from pathlib import Path
+import sys, os, re, time, bisect, tempfile, functools, itertools, threading, weakref, multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+
+if __name__ == '__main__' and '--headless' in sys.argv[1:]:
+    from concat_engine import main
+    sys.exit(main([arg for arg in sys.argv[1:] if arg != '--headless']))
+
+if __name__ == '__main__' and not any(arg.startswith('--') for arg in sys.argv[1:]):
+    from single_instance import forward_to_running_instance
+    if forward_to_running_instance(sys.argv[1] if len(sys.argv) > 1 else None):
+        sys.exit(0)
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QToolBar, QSplitter, QVBoxLayout, QWidget,
-    QTreeView, QFileSystemModel, QPlainTextEdit, QTabWidget, QCheckBox,
-    QLineEdit, QPushButton, QListWidget, QLabel, QMessageBox, QHBoxLayout, QAction, QFrame, QFileDialog
+    QTreeView, QFileIconProvider, QPlainTextEdit, QTabWidget, QCheckBox,
+    QLineEdit, QPushButton, QListWidget, QListWidgetItem, QLabel, QMessageBox, QHBoxLayout, QAction, QFrame, QFileDialog,
+    QAbstractScrollArea, QScrollBar, QStackedWidget, QComboBox, QToolButton, QMenu, QSpinBox
 )
-from PyQt5.QtCore import Qt, QDir, QSize, pyqtSignal, QSettings, QUrl, QTemporaryFile, QMimeData
-from PyQt5.QtGui import QIcon, QPalette, QColor, QFont, QSyntaxHighlighter, QTextCharFormat, QDrag
+from PyQt5.QtCore import (
+    Qt, QDir, QSize, pyqtSignal, QSettings, QUrl, QTemporaryFile, QMimeData, QObject, QByteArray, QTimer,
+    QAbstractItemModel, QModelIndex,
+    QFileSystemWatcher, QStandardPaths, QItemSelection, QItemSelectionModel
+)
+from PyQt5.QtGui import QIcon, QPalette, QColor, QFont, QSyntaxHighlighter, QTextCharFormat, QDrag, QPainter, QTextCursor
 import qtawesome as qta
+from concat_engine import (
+    DEFAULT_MAX_FILE_BYTES, PROFILE_ENV, TRANSFORMS, ContentCache, ProjectIndex, Snapshot,
+    archive_entry, compile_search, detect_language, duplicate_key, enable_timing, estimate_tokens, format_reduction,
+    format_size, format_tokens, is_archive_name, iter_search, iter_selection, iter_segments, iter_transformed,
+    list_archive_directory, parse_language_overrides, path_exists, phase_timer, reduction_totals, register_languages,
+    render_change, render_deleted_summary, render_duplicate, render_segment, render_skipped_summary, split_parts,
+    split_patterns, start_profile, transform_executor, walk_order_key
+)
+
+MAX_WATCHED_PATHS = 8192
+MAX_SEARCH_RESULTS = 2000
+
+def _timed(phase):
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            timer = phase_timer()
+            if timer is None or timer.active(phase):
+                return method(*args, **kwargs)
+            with timer.measure(phase):
+                return method(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def _block_start(starts, lines, index):
+    if index >= len(starts):
+        known = len(starts)
+        total = starts[-1] + lines[known - 1] if starts else 0
+        starts.extend(itertools.accumulate(lines[known:index], initial=total))
+    return starts[index]
+
+class ConcatenationWorker(QObject):
+    segment_ready = pyqtSignal(int, str, object)
+    segment_refreshed = pyqtSignal(int, object)
+    progress = pyqtSignal(int, int, int, int)
+    finished = pyqtSignal(int, int)
+    failed = pyqtSignal(int, str)
+    index_updated = pyqtSignal(object, object)
+
+    def __init__(self, parent=None, cache=None, max_workers=None, read_ahead=64,
+                 max_file_bytes=DEFAULT_MAX_FILE_BYTES):
+        super().__init__(parent)
+        self.cache = cache
+        self.max_file_bytes = max_file_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="concat-read")
+        self.read_ahead = read_ahead
+        self.transforms = ()
+        self.transform_pool = None
+        self.index = None
+        self._job_id = 0
+        self._cancel_event = threading.Event()
+        self._index_cancel_event = threading.Event()
+
+    def start(self, entries, language_for, walk_options=None, known=None):
+        self.cancel()
+        self._job_id += 1
+        self._cancel_event = threading.Event()
+        thread = threading.Thread(
+            target=self._run,
+            args=(self._job_id, list(entries), language_for, walk_options, known, self._cancel_event),
+            name=f"concat-job-{self._job_id}", daemon=True
+        )
+        thread.start()
+        return self._job_id
+
+    def refresh(self, paths, language_for):
+        thread = threading.Thread(
+            target=self._run_refresh, args=(self._job_id, list(paths), language_for, self._cancel_event),
+            name=f"concat-refresh-{self._job_id}", daemon=True
+        )
+        thread.start()
+
+    def update_index(self, index):
+        self._index_cancel_event.set()
+        self._index_cancel_event = threading.Event()
+        thread = threading.Thread(
+            target=self._run_index_update, args=(index, self._index_cancel_event),
+            name="concat-index", daemon=True
+        )
+        thread.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def shutdown(self):
+        self.cancel()
+        self._index_cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.transform_pool is not None:
+            self.transform_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _transformed(self, segments, cancel_event):
+        if not self.transforms:
+            return segments
+        if self.transform_pool is None:
+            self.transform_pool = transform_executor()
+        return iter_transformed(segments, self.transforms, self.transform_pool, cancel_event)
+
+    def _run(self, job_id, entries, language_for, walk_options, known, cancel_event):
+        discovered = 0
+        done = 0
+        bytes_read = 0
+        owners = deque()
+        fresh = []
+
+        def listed():
+            nonlocal discovered
+            for entry in entries:
+                for path in iter_selection([entry], walk_options, cancel_event):
+                    discovered += 1
+                    owners.append(entry)
+                    yield path
+
+        try:
+            segments = iter_segments(listed(), self.executor, self.cache, language_for,
+                                     self.read_ahead, cancel_event, self.max_file_bytes, known)
+            for segment in self._transformed(segments, cancel_event):
+                if cancel_event.is_set():
+                    return
+                if known is None or segment.path not in known:
+                    bytes_read += segment.size
+                    fresh.append(segment)
+                self.segment_ready.emit(job_id, owners.popleft(), segment)
+                done += 1
+                self.progress.emit(job_id, done, discovered, bytes_read)
+            if not cancel_event.is_set():
+                self._record(fresh)
+                self.finished.emit(job_id, done)
+        except Exception as e:
+            self._fail(job_id, cancel_event, e)
+
+    def _run_refresh(self, job_id, paths, language_for, cancel_event):
+        try:
+            segments = iter_segments(paths, self.executor, self.cache, language_for,
+                                     self.read_ahead, cancel_event, self.max_file_bytes)
+            for segment in self._transformed(segments, cancel_event):
+                if cancel_event.is_set():
+                    return
+                self._record([segment])
+                self.segment_refreshed.emit(job_id, segment)
+        except Exception as e:
+            self._fail(job_id, cancel_event, e)
+
+    def _fail(self, job_id, cancel_event, error):
+        if cancel_event.is_set():
+            return
+        cancel_event.set()
+        try:
+            self.failed.emit(job_id, str(error) or type(error).__name__)
+        except RuntimeError:
+            pass
+
+    def _record(self, segments):
+        index = self.index
+        if index is not None:
+            index.record(segments)
+
+    def _run_index_update(self, index, cancel_event):
+        try:
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="concat-index") as executor:
+                stats = index.update(cancel_event=cancel_event, executor=executor, max_file_bytes=self.max_file_bytes)
+            if not cancel_event.is_set():
+                self.index_updated.emit(index, stats)
+        except RuntimeError:
+            cancel_event.set()
+
+class SearchWorker(QObject):
+    match_found = pyqtSignal(int, str, int, object)
+    progress = pyqtSignal(int, int, int)
+    finished = pyqtSignal(int, int, int)
+
+    def __init__(self, parent=None, cache=None, max_workers=None, read_ahead=64):
+        super().__init__(parent)
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="concat-search")
+        self.read_ahead = read_ahead
+        self._job_id = 0
+        self._cancel_event = threading.Event()
+
+    def start(self, root, pattern, walk_options=None):
+        self.cancel()
+        self._job_id += 1
+        self._cancel_event = threading.Event()
+        thread = threading.Thread(
+            target=self._run, args=(self._job_id, root, pattern, walk_options, self._cancel_event),
+            name=f"concat-search-{self._job_id}", daemon=True
+        )
+        thread.start()
+        return self._job_id
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id, root, pattern, walk_options, cancel_event):
+        scanned = 0
+        matched = 0
+        try:
+            for path, result in iter_search([root], pattern, walk_options, self.executor, self.cache,
+                                            cancel_event, self.read_ahead):
+                if cancel_event.is_set():
+                    return
+                scanned += 1
+                if result is not None:
+                    matched += 1
+                    self.match_found.emit(job_id, path, result[0], result[1])
+                if scanned % 256 == 0:
+                    self.progress.emit(job_id, scanned, matched)
+            if not cancel_event.is_set():
+                self.finished.emit(job_id, scanned, matched)
+        except RuntimeError:
+            cancel_event.set()
 
 class CompactToolBar(QToolBar):
     def __init__(self, parent=None):
@@ -33,6 +267,295 @@ class CompactToolBar(QToolBar):
             }
         """)
 
+class _FileNode:
+    __slots__ = ('id', 'name', 'path', 'parent', 'row', 'children', 'by_name', 'is_dir', 'size', 'mtime',
+                 'listed', 'loading', 'generation', 'key', 'explicit')
+
+    def __init__(self, node_id, name, path, parent, is_dir, size=0, mtime=0.0):
+        self.id = node_id
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.row = 0
+        self.children = []
+        self.by_name = {}
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+        self.listed = False
+        self.loading = False
+        self.generation = 0
+        self.key = (not is_dir, name.lower(), name)
+        self.explicit = False
+
+def _is_hidden(name, st):
+    return name.startswith('.') or bool(getattr(st, 'st_file_attributes', 0) & 2)
+
+def _scan_directory(path):
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                    if _is_hidden(entry.name, st):
+                        continue
+                    is_dir = entry.is_dir() or is_archive_name(entry.name)
+                    entries.append((entry.name, is_dir, st.st_size, st.st_mtime))
+                except OSError:
+                    continue
+    except OSError:
+        entries = [entry for entry in list_archive_directory(path) if not entry[0].startswith('.')]
+    return entries
+
+class LazyFileSystemModel(QAbstractItemModel):
+    directoryLoaded = pyqtSignal(str)
+    _listed = pyqtSignal(int, int, object)
+    HEADERS = ("Name", "Size", "Type", "Date Modified")
+
+    def __init__(self, parent=None, max_workers=2):
+        super().__init__(parent)
+        self._next_id = 0
+        self._nodes = {}
+        self._root = self._new_node('', '', None, True)
+        self._root.listed = True
+        self._root_path = ''
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tree-list")
+        self._icons = QFileIconProvider()
+        self._folder_icon = self._icons.icon(QFileIconProvider.Folder)
+        self._file_icon = self._icons.icon(QFileIconProvider.File)
+        self._listed.connect(self._apply_listing)
+        for drive in QDir.drives():
+            path = os.path.abspath(drive.absoluteFilePath())
+            self._insert_nodes(self._root, [self._new_node(path, path, self._root, True)])
+
+    def _new_node(self, name, path, parent, is_dir, size=0, mtime=0.0):
+        self._next_id += 1
+        node = _FileNode(self._next_id, name, path, parent, is_dir, size, mtime)
+        self._nodes[node.id] = node
+        return node
+
+    def _forget(self, node):
+        self._nodes.pop(node.id, None)
+        for child in node.children:
+            self._forget(child)
+
+    def _node(self, index):
+        if not index.isValid():
+            return self._root
+        return self._nodes.get(index.internalId())
+
+    def _index_for(self, node, column=0):
+        if node is None or node is self._root:
+            return QModelIndex()
+        return self.createIndex(node.row, column, node.id)
+
+    def index(self, row_or_path, column=0, parent=QModelIndex()):
+        if isinstance(row_or_path, str):
+            return self._index_for(self._node_for_path(row_or_path))
+        node = self._node(parent)
+        if node is None or not 0 <= row_or_path < len(node.children) or not 0 <= column < len(self.HEADERS):
+            return QModelIndex()
+        return self.createIndex(row_or_path, column, node.children[row_or_path].id)
+
+    def parent(self, index):
+        node = self._node(index)
+        if node is None or node is self._root:
+            return QModelIndex()
+        return self._index_for(node.parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self._node(parent)
+        return len(node.children) if node is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self._node(parent)
+        if node is None or not node.is_dir:
+            return False
+        return bool(node.children) or not node.listed
+
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        return node is not None and node.is_dir and not node.listed and not node.loading
+
+    def fetchMore(self, parent):
+        node = self._node(parent)
+        if node is not None and node.is_dir and not node.loading:
+            self._list(node)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(self.HEADERS):
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        node = self._node(index)
+        if node is None or node is self._root:
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole:
+            return self._display_text(node, column)
+        if role == Qt.DecorationRole and column == 0:
+            return self._folder_icon if node.is_dir else self._file_icon
+        if role == Qt.TextAlignmentRole and column == 1:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def _display_text(self, node, column):
+        if column == 0:
+            return node.name
+        if column == 1:
+            return "" if node.is_dir else format_size(node.size)
+        if column == 2:
+            if node.is_dir:
+                return "Archive" if is_archive_name(node.name) and os.path.isfile(node.path) else "Folder"
+            extension = os.path.splitext(node.name)[1][1:]
+            return f"{extension} File" if extension else "File"
+        if column == 3:
+            return time.strftime("%Y-%m-%d %H:%M", time.localtime(node.mtime)) if node.mtime else ""
+        return None
+
+    def filePath(self, index):
+        node = self._node(index)
+        return node.path if node is not None else ""
+
+    def isDir(self, index):
+        node = self._node(index)
+        return node is not None and node.is_dir
+
+    def rootPath(self):
+        return self._root_path
+
+    def setRootPath(self, path):
+        self._root_path = os.path.abspath(path) if path else ''
+        index = self.index(self._root_path) if self._root_path else QModelIndex()
+        node = self._node(index)
+        if node is not None and node.is_dir and not node.listed and not node.loading:
+            self._list(node)
+        return index
+
+    def refresh(self, path=None):
+        stack = [self._node_for_path(path) if path else self._root]
+        while stack:
+            node = stack.pop()
+            if node is None or not node.is_dir:
+                continue
+            if node is not self._root and (node.listed or node.loading):
+                self._list(node)
+            stack.extend(child for child in node.children if child.listed)
+
+    def _node_for_path(self, path):
+        path = os.path.abspath(path)
+        chain = []
+        while True:
+            chain.append(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        node = self._root
+        for position, path in enumerate(reversed(chain)):
+            name = path if position == 0 else os.path.basename(path)
+            child = node.by_name.get(name)
+            if child is None:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    entry = archive_entry(path)
+                    if entry is None:
+                        return None
+                    child = self._new_node(name, path, node, *entry)
+                else:
+                    is_dir = os.path.isdir(path) or is_archive_name(name)
+                    child = self._new_node(name, path, node, is_dir, st.st_size, st.st_mtime)
+                child.explicit = True
+                self._insert_nodes(node, [child])
+            node = child
+        return node
+
+    def _list(self, node):
+        node.loading = True
+        node.generation += 1
+        future = self._executor.submit(_scan_directory, node.path)
+        node_id, generation = node.id, node.generation
+        future.add_done_callback(lambda f: self._emit_listing(node_id, generation, f))
+
+    def _emit_listing(self, node_id, generation, future):
+        try:
+            self._listed.emit(node_id, generation, future.result())
+        except RuntimeError:
+            pass
+
+    def _apply_listing(self, node_id, generation, entries):
+        node = self._nodes.get(node_id)
+        if node is None or node.generation != generation:
+            return
+        node.loading = False
+        node.listed = True
+        current = {name: (is_dir, size, mtime) for name, is_dir, size, mtime in entries}
+        for row in range(len(node.children) - 1, -1, -1):
+            child = node.children[row]
+            info = current.get(child.name)
+            if info is None and child.explicit and path_exists(child.path):
+                continue
+            if info is None or info[0] != child.is_dir:
+                self._remove_rows(node, row, row)
+            elif (child.size, child.mtime) != info[1:]:
+                child.size, child.mtime = info[1:]
+                self.dataChanged.emit(self._index_for(child, 1), self._index_for(child, 3))
+        missing = sorted(
+            (self._new_node(name, os.path.join(node.path, name), node, is_dir, size, mtime)
+             for name, (is_dir, size, mtime) in current.items() if name not in node.by_name),
+            key=lambda child: child.key
+        )
+        self._insert_nodes(node, missing)
+        self.directoryLoaded.emit(node.path)
+
+    def _insert_nodes(self, node, nodes):
+        keys = [child.key for child in node.children]
+        runs = []
+        for child in nodes:
+            position = bisect.bisect_left(keys, child.key)
+            if runs and runs[-1][0] == position:
+                runs[-1][1].append(child)
+            else:
+                runs.append((position, [child]))
+        inserted = 0
+        parent_index = self._index_for(node)
+        for position, run in runs:
+            position += inserted
+            self.beginInsertRows(parent_index, position, position + len(run) - 1)
+            node.children[position:position] = run
+            for child in run:
+                node.by_name[child.name] = child
+            for row in range(position, len(node.children)):
+                node.children[row].row = row
+            self.endInsertRows()
+            inserted += len(run)
+
+    def _remove_rows(self, node, first, last):
+        self.beginRemoveRows(self._index_for(node), first, last)
+        for child in node.children[first:last + 1]:
+            del node.by_name[child.name]
+            self._forget(child)
+        del node.children[first:last + 1]
+        for row in range(first, len(node.children)):
+            node.children[row].row = row
+        self.endRemoveRows()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
 class EnhancedTreeView(QTreeView):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -53,22 +576,157 @@ class EnhancedTreeView(QTreeView):
                 color: black;
             }
         """)
-        self.model = QFileSystemModel()
-        self.model.setRootPath("")
-        self.model.setFilter(QDir.AllDirs | QDir.AllEntries | QDir.NoDotAndDotDot)
+        self.model = LazyFileSystemModel(self)
         self.setModel(self.model)
-        self.setRootIndex(self.model.index(""))
+        self.setRootIndex(QModelIndex())
         self.setSelectionMode(QTreeView.ExtendedSelection)
+        self.setUniformRowHeights(True)
         self.header().setDefaultSectionSize(200)
         self.header().setStretchLastSection(True)
+        self._column_widths = [0] * LazyFileSystemModel.columnCount(self.model)
+        self._text_widths = {}
+        self.model.rowsInserted.connect(self._measure_rows)
         self.expanded.connect(self._auto_resize)
         self.clicked.connect(self._auto_resize)
 
+    def setRootIndex(self, index):
+        super().setRootIndex(index)
+        if self.model.canFetchMore(index):
+            self.model.fetchMore(index)
+
+    def _text_width(self, text):
+        width = self._text_widths.get(text)
+        if width is None:
+            width = self.fontMetrics().horizontalAdvance(text)
+            if len(self._text_widths) < 4096:
+                self._text_widths[text] = width
+        return width
+
+    def _depth(self, index):
+        depth = 0
+        root = self.rootIndex()
+        while index.isValid() and index != root:
+            index = index.parent()
+            depth += 1
+        return depth
+
+    def _measure_rows(self, parent, first, last):
+        node = self.model._node(parent)
+        if node is None:
+            return
+        indent = self.indentation() * self._depth(parent) + self.iconSize().width() + 32
+        widths = self._column_widths
+        for child in node.children[first:last + 1]:
+            widths[0] = max(widths[0], indent + self.fontMetrics().horizontalAdvance(child.name))
+            for column in range(1, len(widths)):
+                widths[column] = max(widths[column], self._text_width(self.model._display_text(child, column)) + 16)
+
     def _auto_resize(self):
-        for i in range(4):
-            self.resizeColumnToContents(i)
+        header = self.header()
+        for column, width in enumerate(self._column_widths[:-1]):
+            if width > header.sectionSize(column):
+                header.resizeSection(column, width)
+
+class OutputSpool:
+    def __init__(self):
+        self.path = None
+        self.size = 0
+        self.valid = False
+        self._file = None
+        self._blocks = 0
+        self._paths = []
+        self._handed_out = set()
+        self._finalizer = weakref.finalize(self, OutputSpool._remove_files, self._paths)
+
+    def reset(self):
+        self._close_file()
+        if self.path is not None and self.path not in self._handed_out:
+            self._remove_files([self.path])
+            self._paths.remove(self.path)
+        fd, self.path = tempfile.mkstemp(prefix="file_concatenator_", suffix=".md")
+        self._paths.append(self.path)
+        self._file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self._blocks = 0
+        self.valid = True
+
+    def write_block(self, text):
+        if not self.valid:
+            return
+        data = text.encode('utf-8')
+        if self._blocks:
+            data = b'\n' + data
+        self._file.write(data)
+        self.size += len(data)
+        self._blocks += 1
+
+    def invalidate(self):
+        self._close_file()
+        self.valid = False
+
+    def hand_out(self):
+        if not self.valid:
+            return None
+        self._file.flush()
+        self._handed_out.add(self.path)
+        return self.path
+
+    def close(self):
+        self._close_file()
+        self.valid = False
+        self._finalizer()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+class SpoolMimeData(QMimeData):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.setUrls([QUrl.fromLocalFile(path)])
+
+    def formats(self):
+        return ['text/plain'] + [f for f in super().formats() if f != 'text/plain']
+
+    def hasFormat(self, mime_type):
+        return mime_type == 'text/plain' or super().hasFormat(mime_type)
+
+    def retrieveData(self, mime_type, preferred_type):
+        if mime_type == 'text/plain':
+            with open(self.path, 'rb') as f:
+                return QByteArray(f.read())
+        return super().retrieveData(mime_type, preferred_type)
+
+def _text_drag_payload(text):
+    mime_data = QMimeData()
+    mime_data.setText(text)
+    temp_file = QTemporaryFile()
+    if temp_file.open():
+        temp_file.write(text.encode())
+        temp_file.flush()
+        mime_data.setUrls([QUrl.fromLocalFile(temp_file.fileName())])
+    return mime_data, temp_file
+
+def _start_drag(source, mime_data, keepalive=None):
+    drag = QDrag(source)
+    if keepalive is not None:
+        keepalive.setParent(drag)  # This keeps the temp file alive during drag
+    drag.setMimeData(mime_data)
+    drag.exec_(Qt.CopyAction)
 
 class DraggableTextEdit(QPlainTextEdit):
+    drag_payload = None
+
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
             self.drag_start_position = event.pos()
@@ -80,23 +738,169 @@ class DraggableTextEdit(QPlainTextEdit):
 
         if (event.buttons() & Qt.LeftButton) and \
            (event.pos() - self.drag_start_position).manhattanLength() > QApplication.startDragDistance():
-            drag = QDrag(self)
-            mime_data = QMimeData()
-            mime_data.setText(self.toPlainText())
-            
-            # Create temporary file for drag and drop
-            temp_file = QTemporaryFile()
-            if temp_file.open():
-                temp_file.write(self.toPlainText().encode())
-                temp_file.flush()
-                urls = [QUrl.fromLocalFile(temp_file.fileName())]
-                mime_data.setUrls(urls)
-                temp_file.setParent(drag)  # This keeps the temp file alive during drag
-            
-            drag.setMimeData(mime_data)
-            drag.exec_(Qt.CopyAction)
+            if self.drag_payload is not None:
+                _start_drag(self, *self.drag_payload())
+            else:
+                _start_drag(self, *_text_drag_payload(self.toPlainText()))
+
+class VirtualTextView(QAbstractScrollArea):
+    LINE_CHECKPOINT = 256
+    drag_payload = None
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFont(QFont("Consolas", 10))
+        self.viewport().setBackgroundRole(QPalette.Base)
+        self.viewport().setAutoFillBackground(True)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.clear()
+
+    def clear(self):
+        self._blocks = []
+        self._block_lines = []
+        self._block_starts = []
+        self._checkpoints = {}
+        self._line_count = 0
+        self._max_columns = 0
+        self.verticalScrollBar().setValue(0)
+        self.horizontalScrollBar().setValue(0)
+        self._update_scrollbars()
+
+    def set_blocks(self, blocks):
+        self.clear()
+        for text in blocks:
+            self.append_block(text)
+
+    def append_block(self, text):
+        self._blocks.append(text)
+        self._block_lines.append(text.count('\n') + 1)
+        self._line_count += self._block_lines[-1]
+        self._update_scrollbars()
+        self.viewport().update()
+
+    def replace_block(self, index, text):
+        lines = text.count('\n') + 1
+        delta = lines - self._block_lines[index]
+        self._blocks[index] = text
+        self._block_lines[index] = lines
+        self._checkpoints.pop(index, None)
+        self._lines_changed(index, delta)
+
+    def insert_block(self, index, text):
+        self._blocks.insert(index, text)
+        self._block_lines.insert(index, text.count('\n') + 1)
+        self._checkpoints = {i if i < index else i + 1: c for i, c in self._checkpoints.items()}
+        self._lines_changed(index, self._block_lines[index])
+
+    def remove_block(self, index):
+        self._blocks.pop(index)
+        lines = self._block_lines.pop(index)
+        self._checkpoints = {i if i < index else i - 1: c for i, c in self._checkpoints.items() if i != index}
+        self._lines_changed(index, -lines)
+
+    def _lines_changed(self, index, delta):
+        del self._block_starts[index + 1:]
+        self._line_count += delta
+        self._update_scrollbars()
+        self.viewport().update()
+
+    def text(self):
+        return '\n'.join(self._blocks)
+
+    def line_count(self):
+        return self._line_count
+
+    def line(self, number):
+        _block_start(self._block_starts, self._block_lines, len(self._blocks) - 1)
+        block_index = bisect.bisect_right(self._block_starts, number) - 1
+        text = self._blocks[block_index]
+        local = number - self._block_starts[block_index]
+        checkpoints = self._checkpoints.setdefault(block_index, [0])
+        target = local // self.LINE_CHECKPOINT
+        while len(checkpoints) <= target:
+            offset = checkpoints[-1]
+            for _ in range(self.LINE_CHECKPOINT):
+                offset = text.index('\n', offset) + 1
+            checkpoints.append(offset)
+        offset = checkpoints[target]
+        for _ in range(local - target * self.LINE_CHECKPOINT):
+            offset = text.index('\n', offset) + 1
+        end = text.find('\n', offset)
+        return text[offset:] if end == -1 else text[offset:end]
+
+    def first_visible_line(self):
+        return self.verticalScrollBar().value()
+
+    def scroll_to_line(self, number):
+        self.verticalScrollBar().setValue(number)
+
+    def _visible_line_count(self):
+        return max(1, self.viewport().height() // self.fontMetrics().lineSpacing())
+
+    def _update_scrollbars(self):
+        page = self._visible_line_count()
+        self.verticalScrollBar().setPageStep(page)
+        self.verticalScrollBar().setRange(0, max(0, self._line_count - page))
+        char_width = self.fontMetrics().horizontalAdvance(' ')
+        self.horizontalScrollBar().setPageStep(self.viewport().width())
+        self.horizontalScrollBar().setSingleStep(char_width * 4)
+        self.horizontalScrollBar().setRange(0, max(0, self._max_columns * char_width - self.viewport().width()))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_scrollbars()
+
+    def keyPressEvent(self, event):
+        actions = {
+            Qt.Key_Up: QScrollBar.SliderSingleStepSub,
+            Qt.Key_Down: QScrollBar.SliderSingleStepAdd,
+            Qt.Key_PageUp: QScrollBar.SliderPageStepSub,
+            Qt.Key_PageDown: QScrollBar.SliderPageStepAdd,
+            Qt.Key_Home: QScrollBar.SliderToMinimum,
+            Qt.Key_End: QScrollBar.SliderToMaximum,
+        }
+        if event.key() in actions:
+            self.verticalScrollBar().triggerAction(actions[event.key()])
+        else:
+            super().keyPressEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.setFont(self.font())
+        metrics = self.fontMetrics()
+        line_height = metrics.lineSpacing()
+        x = 4 - self.horizontalScrollBar().value()
+        first = self.first_visible_line()
+        last = min(self._line_count, first + self._visible_line_count() + 1)
+        widest = self._max_columns
+        for row, number in enumerate(range(first, last)):
+            text = self.line(number)
+            widest = max(widest, len(text))
+            painter.drawText(x, row * line_height + metrics.ascent(), text.expandtabs(4))
+        painter.end()
+        if widest > self._max_columns:
+            self._max_columns = widest
+            self._update_scrollbars()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_start_position = event.pos()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if not hasattr(self, 'drag_start_position'):
+            return
+        if (event.buttons() & Qt.LeftButton) and \
+           (event.pos() - self.drag_start_position).manhattanLength() > QApplication.startDragDistance():
+            if self.drag_payload is not None:
+                _start_drag(self, *self.drag_payload())
+            else:
+                _start_drag(self, *_text_drag_payload(self.text()))
 
 class ContentTabs(QTabWidget):
+    large_content_threshold = 2 * 1024 * 1024
+    part_copied = pyqtSignal(int, int, int)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setDocumentMode(True)
@@ -104,10 +908,316 @@ class ContentTabs(QTabWidget):
         self.content_editor = DraggableTextEdit()
         self.content_editor.setLineWrapMode(QPlainTextEdit.NoWrap)
         self.content_editor.setFont(QFont("Consolas", 10))
-        self.addTab(self.content_editor, "Content")
+        self.content_editor.textChanged.connect(self._on_text_edited)
+        self.content_editor.drag_payload = self.drag_payload
+        self.large_view = VirtualTextView()
+        self.large_view.drag_payload = self.drag_payload
+        self.spool = OutputSpool()
+        self._updating = False
+        self._edited = False
+        self._spool_dirty = True
+        self.content_stack = QStackedWidget()
+        self.content_stack.addWidget(self.content_editor)
+        self.content_stack.addWidget(self.large_view)
+        self.addTab(self.content_stack, "Content")
+
+        self.jump_list = QComboBox()
+        self.jump_list.setMinimumContentsLength(30)
+        self.jump_list.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLength)
+        self.jump_list.setToolTip("Jump to file")
+        self.jump_list.activated.connect(self._jump_to_entry)
+        self.token_budget = 100000
+        self.parts = []
+        self.token_label = QLabel()
+        self.token_label.setToolTip("Approximate token count of the output")
+        self.budget_input = QSpinBox()
+        self.budget_input.setRange(0, 10 * 1000 * 1000)
+        self.budget_input.setSingleStep(1000)
+        self.budget_input.setSpecialValueText("No limit")
+        self.budget_input.setSuffix(" tokens")
+        self.budget_input.setToolTip("Split the output into parts under this many tokens")
+        self.budget_input.setValue(self.token_budget)
+        self.budget_input.valueChanged.connect(self.set_token_budget)
+        self.parts_list = QComboBox()
+        self.parts_list.setToolTip("Output part")
+        self.parts_list.setVisible(False)
+        self.copy_part_button = QToolButton()
+        self.copy_part_button.setIcon(qta.icon("fa5s.clipboard"))
+        self.copy_part_button.setToolTip("Copy the selected part")
+        self.copy_part_button.setVisible(False)
+        self.copy_part_button.clicked.connect(lambda: self.copy_part(self.parts_list.currentIndex()))
+        corner = QWidget()
+        corner_layout = QHBoxLayout(corner)
+        corner_layout.setContentsMargins(0, 0, 0, 0)
+        corner_layout.setSpacing(4)
+        for widget in (self.token_label, self.budget_input, self.parts_list, self.copy_part_button, self.jump_list):
+            corner_layout.addWidget(widget)
+        self.setCornerWidget(corner, Qt.TopRightCorner)
+        self.parts_timer = QTimer(self)
+        self.parts_timer.setSingleShot(True)
+        self.parts_timer.setInterval(150)
+        self.parts_timer.timeout.connect(self._update_parts)
+        self.jump_list_timer = QTimer(self)
+        self.jump_list_timer.setSingleShot(True)
+        self.jump_list_timer.setInterval(100)
+        self.jump_list_timer.timeout.connect(self._rebuild_jump_list)
+        self._reset_blocks()
+
+    def _reset_blocks(self):
+        self._blocks = []
+        self._block_lines = []
+        self._block_starts = []
+        self._block_tokens = []
+        self._labels = []
+        self._total_chars = 0
+        self.total_tokens = 0
+        self.parts_timer.start()
+        self.jump_list_timer.stop()
+        self.jump_list.clear()
+
+    def is_large(self):
+        return self.content_stack.currentWidget() is self.large_view
+
+    def clear_content(self):
+        self.set_blocks([])
 
     def set_content(self, content):
-        self.content_editor.setPlainText(content)
+        self.set_blocks([content] if content else [], spool=False)
+
+    @_timed('render')
+    def set_blocks(self, blocks, labels=None, spool=True):
+        self._updating = True
+        self._reset_blocks()
+        self._edited = not spool
+        self._spool_dirty = False
+        if spool:
+            self.spool.reset()
+        else:
+            self.spool.invalidate()
+        labels = labels or [None] * len(blocks)
+        total = sum(len(text) for text in blocks)
+        if total > self.large_content_threshold:
+            self._show_large()
+            self.large_view.set_blocks(blocks)
+            self.content_editor.clear()
+        else:
+            self.content_stack.setCurrentWidget(self.content_editor)
+            self.large_view.clear()
+            self.content_editor.setPlainText('\n'.join(blocks))
+        for text, label in zip(blocks, labels):
+            self._record_block(text, label)
+        self._updating = False
+
+    @_timed('render')
+    def append_block(self, text, label=None):
+        self._updating = True
+        if self.is_large():
+            self.large_view.append_block(text)
+        elif self._total_chars + len(text) > self.large_content_threshold:
+            self._show_large()
+            self.large_view.set_blocks(self._blocks + [text])
+            self.content_editor.clear()
+        elif not self._blocks:
+            self.content_editor.setPlainText(text)
+        else:
+            self.content_editor.appendPlainText(text)
+        self._record_block(text, label)
+        self._updating = False
+
+    @_timed('render')
+    def replace_block(self, index, text):
+        if self._edited or index >= len(self._blocks):
+            return False
+        self._updating = True
+        old_lines = self._block_lines[index]
+        new_lines = text.count('\n') + 1
+        if self.is_large():
+            self.large_view.replace_block(index, text)
+        else:
+            start = self.block_start_line(index)
+            document = self.content_editor.document()
+            last = document.findBlockByNumber(start + old_lines - 1)
+            cursor = QTextCursor(document)
+            cursor.setPosition(document.findBlockByNumber(start).position())
+            cursor.setPosition(last.position() + last.length() - 1, QTextCursor.KeepAnchor)
+            cursor.insertText(text)
+        self._total_chars += len(text) - len(self._blocks[index])
+        self._blocks[index] = text
+        self._block_lines[index] = new_lines
+        del self._block_starts[index + 1:]
+        tokens = estimate_tokens(text)
+        self.total_tokens += tokens - self._block_tokens[index]
+        self._block_tokens[index] = tokens
+        self.parts_timer.start()
+        self._spool_dirty = True
+        self._updating = False
+        return True
+
+    @_timed('render')
+    def insert_block(self, index, text, label=None):
+        if self._edited:
+            return False
+        if index >= len(self._blocks):
+            self.append_block(text, label)
+            return True
+        self._updating = True
+        if self.is_large():
+            self.large_view.insert_block(index, text)
+        elif self._total_chars + len(text) > self.large_content_threshold:
+            self._show_large()
+            self.large_view.set_blocks(self._blocks[:index] + [text] + self._blocks[index:])
+            self.content_editor.clear()
+        else:
+            document = self.content_editor.document()
+            cursor = QTextCursor(document)
+            cursor.setPosition(document.findBlockByNumber(self.block_start_line(index)).position())
+            cursor.insertText(text + '\n')
+        self._blocks.insert(index, text)
+        self._block_lines.insert(index, text.count('\n') + 1)
+        del self._block_starts[index + 1:]
+        self._block_tokens.insert(index, estimate_tokens(text))
+        self.total_tokens += self._block_tokens[index]
+        self.parts_timer.start()
+        self._labels.insert(index, label)
+        self._total_chars += len(text)
+        self._spool_dirty = True
+        self.jump_list_timer.start()
+        self._updating = False
+        return True
+
+    @_timed('render')
+    def remove_block(self, index):
+        if self._edited or index >= len(self._blocks):
+            return False
+        self._updating = True
+        if self.is_large():
+            self.large_view.remove_block(index)
+        elif len(self._blocks) == 1:
+            self.content_editor.clear()
+        else:
+            document = self.content_editor.document()
+            start = self.block_start_line(index)
+            cursor = QTextCursor(document)
+            if index + 1 < len(self._blocks):
+                cursor.setPosition(document.findBlockByNumber(start).position())
+                cursor.setPosition(document.findBlockByNumber(start + self._block_lines[index]).position(),
+                                   QTextCursor.KeepAnchor)
+            else:
+                cursor.setPosition(document.findBlockByNumber(start).position() - 1)
+                cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+        self._total_chars -= len(self._blocks.pop(index))
+        del self._block_lines[index]
+        del self._block_starts[index + 1:]
+        self.total_tokens -= self._block_tokens.pop(index)
+        self.parts_timer.start()
+        del self._labels[index]
+        self._spool_dirty = True
+        self.jump_list_timer.start()
+        self._updating = False
+        return True
+
+    def block_count(self):
+        return len(self._blocks)
+
+    def block_start_line(self, index):
+        return _block_start(self._block_starts, self._block_lines, index)
+
+    def _rebuild_jump_list(self):
+        self.jump_list.clear()
+        for index, label in enumerate(self._labels):
+            if label is not None:
+                self.jump_list.addItem(label, index)
+
+    def _sync_spool(self):
+        if self._spool_dirty:
+            self.spool.reset()
+            for text in self._blocks:
+                self.spool.write_block(text)
+            self._spool_dirty = False
+
+    def drag_payload(self):
+        self._sync_spool()
+        path = self.spool.hand_out()
+        if path is not None:
+            return SpoolMimeData(path), None
+        return _text_drag_payload(self.text())
+
+    def _on_text_edited(self):
+        if not self._updating:
+            self._edited = True
+            self._spool_dirty = False
+            self.spool.invalidate()
+            self.parts_timer.start()
+
+    def set_token_budget(self, budget):
+        self.token_budget = budget
+        if self.budget_input.value() != budget:
+            self.budget_input.setValue(budget)
+        self._update_parts()
+
+    def _update_parts(self):
+        self.parts_timer.stop()
+        if self._edited:
+            blocks, tokens = [self.text()], None
+            total = estimate_tokens(blocks[0])
+        else:
+            blocks, tokens, total = self._blocks, self._block_tokens, self.total_tokens
+        over_budget = bool(self.token_budget) and total > self.token_budget
+        self.parts = split_parts(blocks, self.token_budget, tokens) if over_budget else []
+        self.token_label.setText(f"~{format_tokens(total)} tokens" if blocks else "")
+        self.parts_list.clear()
+        for number, (_, part_tokens) in enumerate(self.parts, 1):
+            self.parts_list.addItem(f"Part {number} of {len(self.parts)} (~{format_tokens(part_tokens)})")
+        self.parts_list.setVisible(bool(self.parts))
+        self.copy_part_button.setVisible(bool(self.parts))
+
+    def part_text(self, index):
+        if self.parts_timer.isActive():
+            self._update_parts()
+        return '\n'.join(self.parts[index][0])
+
+    def copy_part(self, index):
+        if self.parts_timer.isActive():
+            self._update_parts()
+        if 0 <= index < len(self.parts):
+            QApplication.clipboard().setText(self.part_text(index))
+            self.part_copied.emit(index + 1, len(self.parts), self.parts[index][1])
+
+    def text(self):
+        if self.is_large():
+            return self.large_view.text()
+        return self.content_editor.toPlainText()
+
+    def _show_large(self):
+        self.content_stack.setCurrentWidget(self.large_view)
+
+    def _record_block(self, text, label):
+        if label is not None and not self.jump_list_timer.isActive():
+            self.jump_list.addItem(label, len(self._blocks))
+        self._labels.append(label)
+        self.spool.write_block(text)
+        self._blocks.append(text)
+        self._block_lines.append(text.count('\n') + 1)
+        self._block_tokens.append(estimate_tokens(text))
+        self.total_tokens += self._block_tokens[-1]
+        self.parts_timer.start()
+        self._total_chars += len(text)
+
+    def jump_to_line(self, line):
+        if self.is_large():
+            self.large_view.scroll_to_line(line)
+            return
+        block = self.content_editor.document().findBlockByNumber(line)
+        cursor = self.content_editor.textCursor()
+        cursor.setPosition(block.position())
+        self.content_editor.setTextCursor(cursor)
+        self.content_editor.verticalScrollBar().setValue(line)
+
+    def _jump_to_entry(self, index):
+        block = self.jump_list.itemData(index)
+        if block is not None:
+            self.jump_to_line(self.block_start_line(block))
 
 class MainWindow(QMainWindow):
     def __init__(self, initial_path=None):
@@ -120,6 +1230,57 @@ class MainWindow(QMainWindow):
             
         self.recent_folders = []
         self.show_absolute_paths = True
+        self.header_format = "# File: {path}"
+        self.fence = "```"
+        self._reset_selection_state()
+        self.include_patterns = ()
+        self.exclude_patterns = ()
+        self.language_overrides = ''
+        self.deduplicate = True
+        self._job_id = 0
+        self.content_cache = ContentCache()
+        self.worker = ConcatenationWorker(self, cache=self.content_cache)
+        self.worker.segment_ready.connect(self._on_segment_ready)
+        self.worker.progress.connect(self._on_job_progress)
+        self.worker.finished.connect(self._on_job_finished)
+        self.worker.failed.connect(self._on_job_failed)
+        self.worker.index_updated.connect(self._on_index_updated)
+        self.search_worker = SearchWorker(self, cache=self.content_cache)
+        self.search_worker.match_found.connect(self._on_search_match)
+        self.search_worker.progress.connect(self._on_search_progress)
+        self.search_worker.finished.connect(self._on_search_finished)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self._start_search)
+        self._search_job_id = 0
+        self._search_matches = []
+        self.project_index = None
+        self.index_dir = os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation), 'FileConcatenator', 'indexes'
+        )
+        self.snapshot = None
+        self._snapshot_path = None
+        self.snapshot_dir = os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation), 'FileConcatenator', 'snapshots'
+        )
+        self.show_changes = False
+        self.snapshot_diffs = False
+        self.worker.segment_refreshed.connect(self._on_segment_refreshed)
+        self._selection_entries = []
+        self._pending_changes = set()
+        self._pending_directories = set()
+        self.selection_timer = QTimer(self)
+        self.selection_timer.setSingleShot(True)
+        self.selection_timer.setInterval(30)
+        self.selection_timer.timeout.connect(lambda: self._on_selection_changed(None, None))
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._on_watched_file_changed)
+        self.watcher.directoryChanged.connect(self._on_watched_directory_changed)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(300)
+        self.refresh_timer.timeout.connect(self._apply_pending_changes)
         self._create_ui()
         self._load_settings()
         
@@ -134,6 +1295,15 @@ class MainWindow(QMainWindow):
             self.path_input.setText(path)
             self._add_recent_folder(path)
             self.statusBar().showMessage(f"Opened path: {path}")
+            self._open_index(path)
+
+    def _open_forwarded_path(self, path):
+        if path:
+            self._initialize_with_path(path)
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
 
     def _create_ui(self):
         self.setStyleSheet("""
@@ -162,6 +1332,62 @@ class MainWindow(QMainWindow):
         self.path_toggle.stateChanged.connect(self._toggle_path_mode)
         toolbar.addWidget(self.path_toggle)
 
+        self.include_input = QLineEdit()
+        self.include_input.setPlaceholderText("Include globs (e.g. *.py; *.md)")
+        self.include_input.setToolTip("Folder selections only include files matching these globs")
+        self.include_input.setFixedWidth(200)
+        self.include_input.editingFinished.connect(self._update_walk_patterns)
+        toolbar.addWidget(self.include_input)
+
+        self.exclude_input = QLineEdit()
+        self.exclude_input.setPlaceholderText("Exclude globs (e.g. tests/*; *.lock)")
+        self.exclude_input.setToolTip("Folder selections skip files and folders matching these globs")
+        self.exclude_input.setFixedWidth(200)
+        self.exclude_input.editingFinished.connect(self._update_walk_patterns)
+        toolbar.addWidget(self.exclude_input)
+
+        self.transform_menu = QMenu(self)
+        self.transform_actions = {}
+        labels = {
+            'license': "Drop License Headers",
+            'comments': "Strip Comments and Docstrings",
+            'trailing_whitespace': "Trim Trailing Whitespace",
+            'blank_lines': "Collapse Blank Lines",
+        }
+        for name in TRANSFORMS:
+            action = self.transform_menu.addAction(labels[name])
+            action.setCheckable(True)
+            action.toggled.connect(self._update_transforms)
+            self.transform_actions[name] = action
+        self.transform_menu.addSeparator()
+        self.dedupe_action = self.transform_menu.addAction("Collapse Duplicate Files")
+        self.dedupe_action.setCheckable(True)
+        self.dedupe_action.setChecked(self.deduplicate)
+        self.dedupe_action.toggled.connect(self._toggle_deduplicate)
+        self.transform_button = QToolButton()
+        self.transform_button.setIcon(qta.icon("fa5s.compress-alt"))
+        self.transform_button.setToolTip("Reduce output size")
+        self.transform_button.setMenu(self.transform_menu)
+        self.transform_button.setPopupMode(QToolButton.InstantPopup)
+        toolbar.addWidget(self.transform_button)
+
+        self.snapshot_menu = QMenu(self)
+        self.save_snapshot_action = self.snapshot_menu.addAction("Save Snapshot of Selection")
+        self.save_snapshot_action.triggered.connect(self._save_snapshot)
+        self.snapshot_menu.addSeparator()
+        self.changes_action = self.snapshot_menu.addAction("Only Changes Since Snapshot")
+        self.changes_action.setCheckable(True)
+        self.changes_action.toggled.connect(self._toggle_changes)
+        self.snapshot_diff_action = self.snapshot_menu.addAction("Show Changes as Unified Diffs")
+        self.snapshot_diff_action.setCheckable(True)
+        self.snapshot_diff_action.toggled.connect(self._toggle_snapshot_diffs)
+        self.snapshot_button = QToolButton()
+        self.snapshot_button.setIcon(qta.icon("fa5s.history"))
+        self.snapshot_button.setToolTip("Snapshot the selection and show only what changed since")
+        self.snapshot_button.setMenu(self.snapshot_menu)
+        self.snapshot_button.setPopupMode(QToolButton.InstantPopup)
+        toolbar.addWidget(self.snapshot_button)
+
         self.nav_bar = QToolBar("Navigation Bar", self)
         self.nav_bar.setObjectName("NavigationBar")
         self.nav_bar.setMovable(False)
@@ -193,9 +1419,32 @@ class MainWindow(QMainWindow):
         left_panel = QWidget()
         left_layout = QVBoxLayout(left_panel)
         left_layout.setContentsMargins(0, 0, 0, 0)
+        search_row = QHBoxLayout()
+        search_row.setContentsMargins(2, 2, 2, 0)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search file contents...")
+        self.search_input.setToolTip("Case-insensitive unless the query contains capitals")
+        self.search_input.textChanged.connect(lambda: self.search_timer.start())
+        self.search_regex_toggle = QCheckBox("Regex")
+        self.search_regex_toggle.stateChanged.connect(lambda: self.search_timer.start())
+        self.select_matches_button = QPushButton("Select All")
+        self.select_matches_button.setToolTip("Replace the selection with every matching file")
+        self.select_matches_button.setEnabled(False)
+        self.select_matches_button.clicked.connect(self._select_search_matches)
+        search_row.addWidget(self.search_input)
+        search_row.addWidget(self.search_regex_toggle)
+        search_row.addWidget(self.select_matches_button)
+        left_layout.addLayout(search_row)
+
         self.file_tree = EnhancedTreeView()
         left_layout.addWidget(self.file_tree)
 
+        self.search_results = QListWidget()
+        self.search_results.setFixedHeight(120)
+        self.search_results.setVisible(False)
+        self.search_results.itemClicked.connect(self._on_search_result_clicked)
+        left_layout.addWidget(self.search_results)
+
         self.recent_folders_widget = QListWidget()
         self.recent_folders_widget.setFixedHeight(80)
         self.recent_folders_widget.itemClicked.connect(self._navigate_to_recent)
@@ -206,35 +1455,15 @@ class MainWindow(QMainWindow):
 
         splitter.addWidget(left_panel)
         self.content_tabs = ContentTabs()
+        self.content_tabs.part_copied.connect(self._on_part_copied)
         splitter.addWidget(self.content_tabs)
         splitter.setSizes([400, 800])
         layout.addWidget(splitter)
         self.statusBar().showMessage("Ready")
-        self.file_tree.selectionModel().selectionChanged.connect(self._on_selection_changed)
+        self.file_tree.selectionModel().selectionChanged.connect(self._schedule_selection_update)
 
     def _get_language_from_extension(self, file_path):
-        ext = Path(file_path).suffix.lower()
-        language_map = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.html': 'html',
-            '.css': 'css',
-            '.java': 'java',
-            '.cpp': 'cpp',
-            '.h': 'cpp',
-            '.c': 'c',
-            '.sh': 'bash',
-            '.md': 'markdown',
-            '.json': 'json',
-            '.xml': 'xml',
-            '.yml': 'yaml',
-            '.yaml': 'yaml',
-            '.ps1': 'ps1',
-            '.sql': 'sql',
-            '.ini': 'ini',
-            '.txt': 'text'
-        }
-        return language_map.get(ext, '')
+        return detect_language(file_path)
 
     def _get_formatted_path(self, path):
         if self.show_absolute_paths:
@@ -243,38 +1472,420 @@ class MainWindow(QMainWindow):
         root_path = self.file_tree.model.filePath(root_index)
         return os.path.relpath(path, root_path)
 
-    def _on_selection_changed(self, selected, deselected):
-        content = []
-        selected_indexes = self.file_tree.selectionModel().selectedIndexes()
-        
+    def _schedule_selection_update(self, selected=None, deselected=None):
+        self.selection_timer.start()
+
+    def _selected_entries(self):
         unique_paths = set()
-        for index in selected_indexes:
+        for index in self.file_tree.selectionModel().selectedIndexes():
             if index.column() == 0:
                 path = self.file_tree.model.filePath(index)
-                if os.path.isfile(path):
+                if path and path_exists(path):
                     unique_paths.add(path)
-        
-        for file_path in sorted(unique_paths):
+        return sorted(unique_paths)
+
+    def _on_selection_changed(self, selected, deselected):
+        self.selection_timer.stop()
+        entries = self._selected_entries()
+        current = set(entries)
+        for entry in [entry for entry in self._entry_paths if entry not in current]:
+            self._drop_entry(entry)
+        self._selection_entries = entries
+
+        pending = [entry for entry in entries if entry not in self._complete_entries]
+        for entry in pending:
+            self._entry_paths.setdefault(entry, set())
+        timer = phase_timer()
+        if timer is not None and pending:
+            timer.reset()
+        self._job_entries = pending
+        self._job_seen = {entry: set() for entry in pending}
+        self._job_known = dict(self._segments_by_path)
+        self._job_id = self.worker.start(
+            pending, detect_language,
+            {'include': self.include_patterns, 'exclude': self.exclude_patterns},
+            self._job_known
+        )
+        if pending:
+            totals = self.project_index.totals(pending) if self.project_index is not None else (0, 0, 0)
+            if totals[0]:
+                self.statusBar().showMessage(f"Reading selection (~{self._format_totals(totals)} indexed)...")
+            else:
+                self.statusBar().showMessage("Reading selection...")
+
+    def _reset_selection_state(self):
+        self.segments = []
+        self.skipped_segments = {}
+        self._segment_keys = []
+        self._shown_keys = {}
+        self._segments_by_path = {}
+        self._entry_paths = {}
+        self._path_entries = {}
+        self._complete_entries = set()
+        self._job_entries = []
+        self._job_seen = {}
+        self._job_known = {}
+        self._summary_shown = False
+        self._duplicate_groups = {}
+        self._duplicate_group_of = {}
+        if hasattr(self, 'content_tabs'):
+            self.content_tabs.clear_content()
+
+    def _drop_entry(self, entry):
+        self._complete_entries.discard(entry)
+        for path in self._entry_paths.pop(entry, ()):
+            self._release_path(entry, path)
+
+    def _release_path(self, entry, path):
+        owners = self._path_entries.get(path)
+        if owners is not None:
+            owners.discard(entry)
+            if not owners:
+                del self._path_entries[path]
+        self._place(path)
+
+    def _place(self, path):
+        owners = self._path_entries.get(path)
+        segment = self._segments_by_path.get(path) if owners else None
+        if not owners:
+            self._segments_by_path.pop(path, None)
+        if segment is not None and segment.skipped is not None:
+            self.skipped_segments[path] = segment
+        else:
+            self.skipped_segments.pop(path, None)
+        new_key = None
+        if segment is not None and segment.skipped is None and not self._is_unchanged(segment):
+            new_key = min((entry, walk_order_key(entry, path)) for entry in owners)
+        old_key = self._shown_keys.get(path)
+        regrouped = self._regroup_duplicate(path, old_key, new_key, segment)
+        updated = True
+        if old_key is not None and old_key == new_key:
+            position = bisect.bisect_left(self._segment_keys, new_key)
+            if self.segments[position] is not segment:
+                self.segments[position] = segment
+                updated = self.content_tabs.replace_block(position, self._render_segment(segment))
+        else:
+            if old_key is not None:
+                position = bisect.bisect_left(self._segment_keys, old_key)
+                del self._segment_keys[position]
+                del self.segments[position]
+                del self._shown_keys[path]
+                updated = self.content_tabs.remove_block(position)
+            if new_key is not None:
+                position = bisect.bisect_left(self._segment_keys, new_key)
+                self._segment_keys.insert(position, new_key)
+                self.segments.insert(position, segment)
+                self._shown_keys[path] = new_key
+                updated = self.content_tabs.insert_block(
+                    position, self._render_segment(segment), self._get_formatted_path(path)
+                ) and updated
+        for key in regrouped:
+            if not updated:
+                break
+            if key != new_key:
+                position = bisect.bisect_left(self._segment_keys, key)
+                updated = self.content_tabs.replace_block(position, self._render_segment(self.segments[position]))
+        if not updated:
+            self._render_segments()
+
+    def _regroup_duplicate(self, path, old_key, new_key, segment):
+        regrouped = []
+        digest = self._duplicate_group_of.get(path)
+        key = duplicate_key(segment) if segment is not None else None
+        if digest is not None and old_key == new_key and digest == key:
+            return regrouped
+        self._duplicate_group_of.pop(path, None)
+        if digest is not None:
+            group = self._duplicate_groups[digest]
+            group.remove(old_key)
+            if not group:
+                del self._duplicate_groups[digest]
+            elif old_key < group[0]:
+                regrouped = list(group)
+        if new_key is not None and key is not None:
+            group = self._duplicate_groups.setdefault(key, [])
+            bisect.insort(group, new_key)
+            self._duplicate_group_of[path] = key
+            if group[0] == new_key:
+                regrouped = list(group)
+        return regrouped
+
+    def _duplicate_original(self, segment):
+        key = duplicate_key(segment)
+        if not self.deduplicate or key is None:
+            return None
+        group = self._duplicate_groups.get(key)
+        if not group or group[0] == self._shown_keys.get(segment.path):
+            return None
+        return self.segments[bisect.bisect_left(self._segment_keys, group[0])]
+
+    def _duplicate_count(self):
+        if not self.deduplicate:
+            return 0
+        return sum(len(group) - 1 for group in self._duplicate_groups.values())
+
+    def _is_unchanged(self, segment):
+        return self.show_changes and self.snapshot is not None and not self.snapshot.changed(segment)
+
+    def _deleted_paths(self):
+        if not self.show_changes or self.snapshot is None:
+            return []
+        return self.snapshot.deleted(self._selection_entries)
+
+    def _skipped_summary(self):
+        skipped = [self.skipped_segments[path] for path in sorted(self.skipped_segments)]
+        summaries = (
+            render_skipped_summary(skipped, self._get_formatted_path),
+            render_deleted_summary(self._deleted_paths(), self._get_formatted_path),
+        )
+        return '\n\n'.join(summary for summary in summaries if summary)
+
+    def _update_summary(self):
+        summary = self._skipped_summary()
+        index = len(self.segments)
+        if summary and self._summary_shown:
+            updated = self.content_tabs.replace_block(index, summary)
+        elif summary:
+            updated = self.content_tabs.insert_block(index, summary)
+        elif self._summary_shown:
+            updated = self.content_tabs.remove_block(index)
+        else:
+            updated = True
+        self._summary_shown = bool(summary)
+        if not updated:
+            self._render_segments()
+
+    def _update_walk_patterns(self):
+        include = split_patterns(self.include_input.text())
+        exclude = split_patterns(self.exclude_input.text())
+        if (include, exclude) != (self.include_patterns, self.exclude_patterns):
+            self.include_patterns, self.exclude_patterns = include, exclude
+            self._reset_selection_state()
+            self._on_selection_changed(None, None)
+
+    def _set_transforms(self, names):
+        for name, action in self.transform_actions.items():
+            action.blockSignals(True)
+            action.setChecked(name in names)
+            action.blockSignals(False)
+        self._update_transforms()
+
+    def _toggle_deduplicate(self, checked):
+        self.deduplicate = checked
+        self._render_segments()
+
+    def _toggle_changes(self, checked):
+        self.show_changes = checked
+        self._apply_snapshot()
+
+    def _toggle_snapshot_diffs(self, checked):
+        self.snapshot_diffs = checked
+        self._render_segments()
+
+    def _apply_snapshot(self):
+        for path in list(self._segments_by_path):
+            self._place(path)
+        self._update_summary()
+
+    def _save_snapshot(self):
+        root = self._current_root()
+        if root is None or not self._segments_by_path:
+            self.statusBar().showMessage("Select files to snapshot first")
+            return
+        snapshot = Snapshot.from_segments(self._segments_by_path.values())
+        path = Snapshot.path_for(root, self.snapshot_dir)
+        try:
+            snapshot.save(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not save snapshot: {e}")
+            return
+        self.snapshot = snapshot
+        self._snapshot_path = path
+        self._apply_snapshot()
+        self.statusBar().showMessage(f"Saved snapshot of {len(snapshot)} file(s)")
+
+    def _load_snapshot(self, folder):
+        path = Snapshot.path_for(folder, self.snapshot_dir)
+        if path == self._snapshot_path:
+            return
+        self._snapshot_path = path
+        self.snapshot = None
+        if os.path.exists(path):
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    formatted_path = self._get_formatted_path(file_path)
-                    language = self._get_language_from_extension(file_path)
-                    content.extend([
-                        f"# File: {formatted_path}",
-                        f"```{language}" if language else "",
-                        f.read(),
-                        "```" if language else "",
-                        ""
-                    ])
-            except Exception as e:
-                content.append(f"# Error reading {formatted_path}: {str(e)}")
-
-        self.content_tabs.set_content('\n'.join(content))
-        self.statusBar().showMessage(f"Selected {len(unique_paths)} file(s)")
-    
-    def _refresh(self): self.file_tree.model.setRootPath("")
-    def _copy(self): QApplication.clipboard().setText(self.content_tabs.content_editor.toPlainText())
-    def _paste(self): self.content_tabs.content_editor.setPlainText(QApplication.clipboard().text())
+                self.snapshot = Snapshot.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading snapshot: {e}")
+        if self.show_changes:
+            self._apply_snapshot()
+
+    def _update_transforms(self):
+        transforms = tuple(name for name, action in self.transform_actions.items() if action.isChecked())
+        if transforms != self.worker.transforms:
+            self.worker.transforms = transforms
+            self._reset_selection_state()
+            self._on_selection_changed(None, None)
+
+    @_timed('format')
+    def _render_segment(self, segment):
+        original = self._duplicate_original(segment)
+        if original is not None:
+            return render_duplicate(self._get_formatted_path(segment.path), self._get_formatted_path(original.path),
+                                    self.header_format)
+        if self.show_changes and self.snapshot_diffs and self.snapshot is not None:
+            return render_change(segment, self._get_formatted_path(segment.path), self.snapshot.previous(segment),
+                                 self.header_format, self.fence)
+        return render_segment(segment, self._get_formatted_path(segment.path), self.header_format, self.fence)
+
+    def _render_segments(self):
+        blocks = [self._render_segment(segment) for segment in self.segments]
+        labels = [self._get_formatted_path(segment.path) for segment in self.segments]
+        summary = self._skipped_summary()
+        self._summary_shown = bool(summary)
+        if summary:
+            blocks.append(summary)
+            labels.append(None)
+        self.content_tabs.set_blocks(blocks, labels)
+
+    def _set_render_options(self, header_format=None, fence=None):
+        if header_format is not None:
+            self.header_format = header_format
+        if fence is not None:
+            self.fence = fence
+        self._render_segments()
+
+    def _on_segment_ready(self, job_id, entry, segment):
+        if job_id != self._job_id:
+            return
+        path = segment.path
+        if self._job_known.get(path) is segment:
+            segment = self._segments_by_path.get(path, segment)
+        self._segments_by_path[path] = segment
+        self._path_entries.setdefault(path, set()).add(entry)
+        self._entry_paths[entry].add(path)
+        self._job_seen[entry].add(path)
+        self._place(path)
+
+    def _on_segment_refreshed(self, job_id, segment):
+        if job_id != self._job_id or segment.path not in self._path_entries:
+            return
+        self._segments_by_path[segment.path] = segment
+        if segment.path not in self.watcher.files():
+            self.watcher.addPath(segment.path)
+        self._place(segment.path)
+        self._update_summary()
+        self.statusBar().showMessage(f"Refreshed {self._get_formatted_path(segment.path)}")
+
+    def _update_watches(self):
+        folders = [entry for entry in self._selection_entries if os.path.isdir(entry)]
+        wanted = set(folders)
+        for path in self._path_entries:
+            wanted.add(path)
+            parent = os.path.dirname(path)
+            if any(parent == folder or parent.startswith(folder + os.sep) for folder in folders):
+                wanted.add(parent)
+        wanted = set(sorted(wanted)[:MAX_WATCHED_PATHS])
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        if watched - wanted:
+            self.watcher.removePaths(list(watched - wanted))
+        added = [path for path in wanted - watched if os.path.exists(path)]
+        if added:
+            self.watcher.addPaths(added)
+
+    def _on_watched_file_changed(self, path):
+        self._pending_changes.add(path)
+        self.refresh_timer.start()
+
+    def _on_watched_directory_changed(self, path):
+        self._pending_directories.add(path)
+        self.refresh_timer.start()
+
+    def _apply_pending_changes(self):
+        changed = [path for path in self._pending_changes if path in self._path_entries]
+        directories = self._pending_directories | {os.path.dirname(p) for p in changed if not os.path.isfile(p)}
+        self._pending_changes = set()
+        self._pending_directories = set()
+        for directory in directories:
+            self.file_tree.model.refresh(directory)
+            for entry in self._selection_entries:
+                if directory == entry or directory.startswith(entry + os.sep):
+                    self._complete_entries.discard(entry)
+        if any(entry not in self._complete_entries for entry in self._selection_entries):
+            self._on_selection_changed(None, None)
+        changed = [path for path in changed if os.path.isfile(path)]
+        if changed:
+            self.worker.refresh(sorted(changed), detect_language)
+
+    def _on_job_progress(self, job_id, done, total, bytes_read):
+        if job_id == self._job_id and done < total:
+            self.statusBar().showMessage(f"Reading {done}/{total} file(s), {format_size(bytes_read)}...")
+
+    def _on_job_failed(self, job_id, message):
+        if job_id != self._job_id:
+            return
+        self._job_entries = []
+        self._update_summary()
+        self.statusBar().showMessage(f"Reading selection failed: {message}")
+
+    def _on_job_finished(self, job_id, count):
+        if job_id != self._job_id:
+            return
+        for entry in self._job_entries:
+            stale = self._entry_paths.get(entry, set()) - self._job_seen[entry]
+            for path in stale:
+                self._entry_paths[entry].discard(path)
+                self._release_path(entry, path)
+            self._complete_entries.add(entry)
+        self._job_entries = []
+        self._update_summary()
+
+        skipped = len(self.skipped_segments)
+        truncated = sum(segment.truncated for segment in self.segments)
+        message = f"Selected {len(self.segments)} file(s)"
+        if skipped:
+            message += f", skipped {skipped}"
+        if truncated:
+            message += f", truncated {truncated}"
+        duplicates = self._duplicate_count()
+        if duplicates:
+            message += f", {duplicates} duplicate(s)"
+        if self.show_changes and self.snapshot is None:
+            message += ", no snapshot saved"
+        elif self.show_changes:
+            unchanged = sum(self._is_unchanged(segment) for segment in self._segments_by_path.values())
+            message += f", {unchanged} unchanged since snapshot"
+            deleted = len(self._deleted_paths())
+            if deleted:
+                message += f", {deleted} deleted"
+        if self.worker.transforms:
+            message += f"; {format_reduction(reduction_totals(self.segments))}"
+        timer = phase_timer()
+        if timer is not None:
+            message += f" [{timer.summary()}]"
+        self.statusBar().showMessage(message)
+        self._update_watches()
+        stats = self.content_cache.stats()
+        tooltip = (
+            f"Cache: {stats['hits']} hits, {stats['backing_hits']} from index, {stats['misses']} misses, "
+            f"{stats['evictions']} evictions, "
+            f"{format_size(stats['bytes'])} / {format_size(stats['max_bytes'])}"
+        )
+        if timer is not None:
+            tooltip += "\nSlowest files:" + ''.join(
+                f"\n{seconds * 1000:.1f} ms  {format_size(num_bytes)}  {self._get_formatted_path(path)}"
+                for path, seconds, num_bytes in timer.slowest()
+            )
+        self.statusBar().setToolTip(tooltip)
+
+    def _refresh(self):
+        self.file_tree.model.refresh()
+        self._reset_selection_state()
+        self._on_selection_changed(None, None)
+
+    def _copy(self): QApplication.clipboard().setText(self.content_tabs.text())
+
+    def _on_part_copied(self, number, count, tokens):
+        self.statusBar().showMessage(f"Copied part {number} of {count} (~{format_tokens(tokens)} tokens)")
+    def _paste(self): self.content_tabs.set_content(QApplication.clipboard().text())
 
     def _open_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Open Folder", os.getcwd())
@@ -283,15 +1894,126 @@ class MainWindow(QMainWindow):
             self.file_tree.setRootIndex(self.file_tree.model.index(folder))
             self.path_input.setText(folder)
             self.statusBar().showMessage(f"Opened folder: {folder}")
+            self._open_index(folder)
 
     def _navigate_to_path(self):
         path = self.path_input.text().strip()
         if os.path.isdir(path):
             self.file_tree.setRootIndex(self.file_tree.model.index(path))
             self._add_recent_folder(path)
+            self._open_index(path)
         else:
             QMessageBox.warning(self, "Error", "The specified path is invalid.")
 
+    def _current_root(self):
+        root = self.file_tree.model.filePath(self.file_tree.rootIndex())
+        return root if root and os.path.isdir(root) else None
+
+    def _start_search(self):
+        self.search_timer.stop()
+        self.search_worker.cancel()
+        self._search_job_id = 0
+        self._search_matches = []
+        self.search_results.clear()
+        self.select_matches_button.setEnabled(False)
+        query = self.search_input.text()
+        self.search_results.setVisible(bool(query))
+        if not query:
+            return
+        root = self._current_root()
+        if root is None:
+            self.statusBar().showMessage("Open a folder to search its files")
+            return
+        try:
+            pattern = compile_search(query, self.search_regex_toggle.isChecked())
+        except re.error as e:
+            self.statusBar().showMessage(f"Invalid pattern: {e}")
+            return
+        self._search_job_id = self.search_worker.start(
+            root, pattern, {'include': self.include_patterns, 'exclude': self.exclude_patterns}
+        )
+        self.statusBar().showMessage(f"Searching {root}...")
+
+    def _on_search_match(self, job_id, path, count, lines):
+        if job_id != self._search_job_id:
+            return
+        self._search_matches.append(path)
+        self.select_matches_button.setEnabled(True)
+        if self.search_results.count() < MAX_SEARCH_RESULTS:
+            item = QListWidgetItem(f"{os.path.relpath(path, self._current_root() or os.sep)} ({count})")
+            item.setData(Qt.UserRole, path)
+            item.setToolTip('\n'.join(f"{number}: {text}" for number, text in lines))
+            self.search_results.addItem(item)
+
+    def _on_search_progress(self, job_id, scanned, matched):
+        if job_id == self._search_job_id:
+            self.statusBar().showMessage(f"Searching... {matched} match(es) in {scanned} file(s)")
+
+    def _on_search_finished(self, job_id, scanned, matched):
+        if job_id != self._search_job_id:
+            return
+        message = f"Found matches in {matched} of {scanned} file(s)"
+        if matched > MAX_SEARCH_RESULTS:
+            message += f" (showing first {MAX_SEARCH_RESULTS})"
+        self.statusBar().showMessage(message)
+
+    def _on_search_result_clicked(self, item):
+        index = self.file_tree.model.index(item.data(Qt.UserRole))
+        if index.isValid():
+            self.file_tree.scrollTo(index)
+            self.file_tree.selectionModel().select(index, QItemSelectionModel.Select | QItemSelectionModel.Rows)
+
+    def _select_search_matches(self):
+        selection = QItemSelection()
+        for path in self._search_matches:
+            index = self.file_tree.model.index(path)
+            if index.isValid():
+                selection.select(index, index)
+        self.file_tree.selectionModel().select(
+            selection, QItemSelectionModel.ClearAndSelect | QItemSelectionModel.Rows
+        )
+
+    def _open_index(self, folder):
+        folder = os.path.abspath(folder)
+        self.file_tree.model.setRootPath(folder)
+        self._load_snapshot(folder)
+        if self.search_input.text():
+            self.search_timer.start()
+        if self.project_index is not None and self.project_index.root == folder:
+            return
+        self._close_index()
+        try:
+            self.project_index = ProjectIndex(folder, self.index_dir)
+        except Exception as e:
+            print(f"Error opening project index: {e}")
+            return
+        self.worker.index = self.project_index
+        self.content_cache.backing = self.project_index
+        totals = self.project_index.totals()
+        if totals[0]:
+            self.statusBar().showMessage(f"Opened folder: {folder} ({self._format_totals(totals)} indexed)")
+        self.worker.update_index(self.project_index)
+
+    def _close_index(self):
+        if self.project_index is not None:
+            self.worker.index = None
+            self.content_cache.backing = None
+            self.project_index.close()
+            self.project_index = None
+
+    def _format_totals(self, totals):
+        files, size, lines = totals
+        return f"{files} file(s), {format_size(size)}, {lines} lines"
+
+    def _on_index_updated(self, index, stats):
+        if index is not self.project_index:
+            return
+        message = f"Indexed {self._format_totals(index.totals())}"
+        changes = [f"{stats[key]} {key}" for key in ('added', 'changed', 'removed') if stats[key]]
+        if changes:
+            message += f" ({', '.join(changes)})"
+        self.statusBar().showMessage(message)
+
     def _add_recent_folder(self, folder):
         if folder not in self.recent_folders:
             self.recent_folders.insert(0, folder)
@@ -305,6 +2027,7 @@ class MainWindow(QMainWindow):
         if os.path.exists(folder):
             self.file_tree.setRootIndex(self.file_tree.model.index(folder))
             self.path_input.setText(folder)
+            self._open_index(folder)
         else:
             QMessageBox.warning(self, "Error", "Folder no longer exists.")
             self.recent_folders.remove(folder)
@@ -312,7 +2035,7 @@ class MainWindow(QMainWindow):
 
     def _toggle_path_mode(self, state):
         self.show_absolute_paths = state == Qt.Checked
-        self._on_selection_changed(self.file_tree.selectionModel().selection(), None)
+        self._render_segments()
 
     def _load_settings(self):
         try:
@@ -321,6 +2044,27 @@ class MainWindow(QMainWindow):
                 self.restoreGeometry(settings.value('geometry'))
             if settings.contains('windowState'):
                 self.restoreState(settings.value('windowState'))
+            if settings.contains('max_file_mb'):
+                self.worker.max_file_bytes = int(settings.value('max_file_mb', type=float) * 1024 * 1024)
+            if settings.contains('cache_max_mb'):
+                self.content_cache.set_max_bytes(settings.value('cache_max_mb', type=int) * 1024 * 1024)
+            if settings.contains('token_budget'):
+                self.content_tabs.set_token_budget(settings.value('token_budget', type=int))
+            self.header_format = settings.value('header_format', self.header_format)
+            self.fence = settings.value('fence', self.fence)
+            self.include_input.setText(settings.value('include_patterns', ''))
+            self.exclude_input.setText(settings.value('exclude_patterns', ''))
+            self.include_patterns = split_patterns(self.include_input.text())
+            self.exclude_patterns = split_patterns(self.exclude_input.text())
+            self.language_overrides = settings.value('language_overrides', '')
+            register_languages(parse_language_overrides(self.language_overrides))
+            self._set_transforms(split_patterns(settings.value('transforms', '')))
+            if settings.contains('deduplicate'):
+                self.dedupe_action.setChecked(settings.value('deduplicate', type=bool))
+            if settings.contains('show_changes'):
+                self.changes_action.setChecked(settings.value('show_changes', type=bool))
+            if settings.contains('snapshot_diffs'):
+                self.snapshot_diff_action.setChecked(settings.value('snapshot_diffs', type=bool))
             if settings.contains('show_absolute_paths'):
                 self.show_absolute_paths = settings.value('show_absolute_paths', type=bool)
             else:
@@ -332,11 +2076,28 @@ class MainWindow(QMainWindow):
             self.path_toggle.setChecked(True)
 
     def closeEvent(self, event):
+        self.worker.shutdown()
+        self.search_worker.shutdown()
+        self.file_tree.model.shutdown()
+        self._close_index()
+        self.content_tabs.spool.close()
         try:
             settings = QSettings('FileConcatenator', 'Settings')
             settings.setValue('geometry', self.saveGeometry())
             settings.setValue('windowState', self.saveState())
             settings.setValue('show_absolute_paths', self.show_absolute_paths)
+            settings.setValue('header_format', self.header_format)
+            settings.setValue('fence', self.fence)
+            settings.setValue('include_patterns', self.include_input.text())
+            settings.setValue('exclude_patterns', self.exclude_input.text())
+            settings.setValue('language_overrides', self.language_overrides)
+            settings.setValue('transforms', ';'.join(self.worker.transforms))
+            settings.setValue('deduplicate', self.deduplicate)
+            settings.setValue('show_changes', self.show_changes)
+            settings.setValue('snapshot_diffs', self.snapshot_diffs)
+            settings.setValue('max_file_mb', self.worker.max_file_bytes / (1024 * 1024))
+            settings.setValue('cache_max_mb', self.content_cache.max_bytes // (1024 * 1024))
+            settings.setValue('token_budget', self.content_tabs.token_budget)
             settings.sync()
         except Exception as e:
             print(f"Error saving settings: {e}")
@@ -346,10 +2107,32 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
     
+    args = sys.argv[1:]
+    single_instance = '--new-instance' not in args
+    if not single_instance:
+        args.remove('--new-instance')
+    if '--timing' in args:
+        args.remove('--timing')
+        enable_timing()
+    profile_path = os.environ.get(PROFILE_ENV)
+    if '--profile' in args[:-1]:
+        position = args.index('--profile')
+        profile_path = args[position + 1]
+        del args[position:position + 2]
+    stop_profile = start_profile(profile_path) if profile_path else None
+
     initial_path = None
-    if len(sys.argv) > 1:
-        initial_path = sys.argv[1]
+    if args:
+        initial_path = args[0]
     
     window = MainWindow(initial_path)
+    if single_instance:
+        from single_instance import InstanceServer
+        server = InstanceServer(app)
+        server.path_received.connect(window._open_forwarded_path)
+        server.listen()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    status = app.exec_()
+    if stop_profile is not None:
+        stop_profile()
+    sys.exit(status)
\ No newline at end of file
@@ -0,0 +1,76 @@
+import os, re, getpass
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtNetwork import QAbstractSocket, QLocalServer, QLocalSocket
+
+INSTANCE_ENV = 'FILE_CONCATENATOR_INSTANCE'
+CONNECT_TIMEOUT_MS = 250
+
+def server_name():
+    name = os.environ.get(INSTANCE_ENV)
+    if name:
+        return name
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = 'user'
+    return 'FileConcatenator-' + re.sub(r'[^A-Za-z0-9_.-]', '_', user)
+
+def _connect(name, timeout):
+    socket = QLocalSocket()
+    socket.connectToServer(name)
+    return socket if socket.waitForConnected(timeout) else None
+
+def forward_to_running_instance(path=None, name=None, timeout=CONNECT_TIMEOUT_MS):
+    socket = _connect(name or server_name(), timeout)
+    if socket is None:
+        return False
+    socket.write((os.path.abspath(path) if path else '').encode('utf-8') + b'\n')
+    sent = socket.waitForBytesWritten(timeout) or socket.bytesToWrite() == 0
+    socket.disconnectFromServer()
+    if socket.state() != QLocalSocket.UnconnectedState:
+        socket.waitForDisconnected(timeout)
+    return sent
+
+class InstanceServer(QObject):
+    path_received = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self._on_new_connection)
+        self._buffers = {}
+
+    def listen(self, name=None):
+        name = name or server_name()
+        if self.server.listen(name):
+            return True
+        if self.server.serverError() == QAbstractSocket.AddressInUseError and _connect(name, CONNECT_TIMEOUT_MS) is None:
+            QLocalServer.removeServer(name)
+            return self.server.listen(name)
+        return False
+
+    def close(self):
+        self.server.close()
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self._buffers[socket] = b''
+            socket.readyRead.connect(lambda socket=socket: self._read(socket))
+            socket.disconnected.connect(lambda socket=socket: self._finish(socket))
+            self._read(socket)
+
+    def _read(self, socket):
+        buffer = self._buffers.get(socket)
+        if buffer is None or not socket.bytesAvailable():
+            return
+        buffer += bytes(socket.readAll())
+        *lines, self._buffers[socket] = buffer.split(b'\n')
+        for line in lines:
+            self.path_received.emit(line.decode('utf-8', 'replace'))
+
+    def _finish(self, socket):
+        self._read(socket)
+        self._buffers.pop(socket, None)
+        socket.deleteLater()
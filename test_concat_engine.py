@@ -0,0 +1,458 @@
+import io
+import codecs
+import os
+import pytest
+import concat_engine
+from concat_engine import (
+    TRANSFORMS, ContentCache, ProjectIndex, Segment, Snapshot, apply_transforms, compile_search, concatenate, detect_language,
+    enable_timing, estimate_tokens,
+    iter_search, iter_segments, iter_selection, iter_transformed, iter_tree_files, main, parse_language_overrides, read_segment,
+    register_languages, relative_display_path, render_segment, search_file, split_parts, strip_comments, transform_executor
+)
+
+def test_content_cache_lru_eviction():
+    cache = ContentCache(max_bytes=10)
+    cache.put('a', 1, 4, 'aaaa')
+    cache.put('b', 1, 4, 'bbbb')
+    assert cache.get('a', 1, 4) == 'aaaa'
+    cache.put('c', 1, 4, 'cccc')
+    assert cache.get('b', 1, 4) is None
+    assert cache.get('a', 1, 4) == 'aaaa'
+    assert cache.get('a', 2, 4) is None
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['bytes'] == 8
+
+def test_tree_walker_prunes_ignored_entries(project_tree):
+    found = [os.path.relpath(p, project_tree).replace(os.sep, '/') for p in iter_tree_files(str(project_tree))]
+    assert found == ['.gitignore', 'keep.log', 'main.py', 'pkg/.gitignore', 'pkg/module.py', 'pkg/notes.md']
+
+def test_tree_walker_include_exclude(project_tree):
+    found = [os.path.basename(p) for p in iter_tree_files(str(project_tree), include=('*.py',), exclude=('pkg',))]
+    assert found == ['main.py']
+
+def test_tree_walker_uses_ancestor_gitignore(project_tree):
+    found = [os.path.basename(p) for p in iter_tree_files(str(project_tree / 'pkg'))]
+    assert found == ['.gitignore', 'module.py', 'notes.md']
+
+def test_iter_segments_preserves_order(tmp_path):
+    paths = []
+    for i in range(50):
+        file_path = tmp_path / f"file_{i:02d}.txt"
+        file_path.write_text(str(i) * (50 - i), encoding='utf-8')
+        paths.append(str(file_path))
+    segments = list(iter_segments(paths, read_ahead=4))
+    assert [segment.path for segment in segments] == paths
+    assert segments[3].content == '3' * 47
+    assert segments[3].language == 'text'
+
+def test_iter_segments_reports_errors(tmp_path):
+    missing = str(tmp_path / "missing.py")
+    segment, = iter_segments([missing])
+    assert segment.error is not None
+    assert segment.language == 'python'
+
+def test_iter_selection_deduplicates(project_tree):
+    paths = list(iter_selection([str(project_tree / 'pkg'), str(project_tree / 'pkg' / 'module.py')]))
+    assert len(paths) == len(set(paths)) == 3
+
+def test_concatenate_streams_output(project_tree):
+    out = io.StringIO()
+    stats = concatenate([str(project_tree / 'pkg')], out, display_path=relative_display_path(str(project_tree)))
+    assert stats['files'] == 3
+    text = out.getvalue()
+    assert "# File: " + os.path.join('pkg', 'module.py') in text
+    assert "```python\nVALUE = 1\n```" in text
+
+def test_headless_cli(project_tree, tmp_path, capsys):
+    output = tmp_path / "bundle.md"
+    assert main([str(project_tree), '-o', str(output), '--include', '*.py', '--relative-to', str(project_tree)]) == 0
+    text = output.read_text(encoding='utf-8')
+    assert text.count('# File:') == 2
+    assert "# File: main.py" in text
+    assert "Concatenated 2 file(s)" in capsys.readouterr().err
+
+def test_binary_files_are_skipped(tmp_path):
+    binary = tmp_path / "blob.bin"
+    binary.write_bytes(b"\x7fELF\x02\x01\x00\x00" * 100)
+    segment = read_segment(str(binary), '')
+    assert segment.skipped == 'binary'
+
+    out = io.StringIO()
+    (tmp_path / "a.txt").write_text("hello", encoding='utf-8')
+    stats = concatenate([str(tmp_path)], out)
+    assert stats['files'] == 1
+    assert stats['skipped'] == 1
+    assert "# Skipped 1 file(s):" in out.getvalue()
+    assert "blob.bin (binary" in out.getvalue()
+
+def test_oversized_files_are_truncated(tmp_path):
+    big = tmp_path / "big.log"
+    big.write_text("head\n" + "x" * 10000 + "\ntail", encoding='utf-8')
+    segment = read_segment(str(big), '', max_bytes=1000)
+    assert segment.truncated
+    assert segment.content.startswith("head")
+    assert segment.content.endswith("tail")
+    assert "bytes omitted" in segment.content
+    assert len(segment.content) < 10000
+
+def test_large_files_decode_through_mmap(tmp_path, monkeypatch):
+    monkeypatch.setattr('concat_engine.MMAP_THRESHOLD', 16)
+    text_file = tmp_path / "large.txt"
+    text_file.write_bytes("line one\r\nline two \u00e9\r\n".encode('utf-8'))
+    segment = read_segment(str(text_file), 'text')
+    assert segment.content == "line one\nline two \u00e9\n"
+    assert segment.encoding == 'utf-8'
+
+@pytest.mark.parametrize("data, encoding, expected", [
+    ("caf\u00e9 \u20ac".encode('cp1252'), 'cp1252', "caf\u00e9 \u20ac"),
+    (codecs.BOM_UTF8 + "bom".encode('utf-8'), 'utf-8-sig', "bom"),
+    ("wide text".encode('utf-16'), 'utf-16', "wide text"),
+])
+def test_encoding_fallback(tmp_path, data, encoding, expected):
+    source = tmp_path / "source.txt"
+    source.write_bytes(data)
+    segment = read_segment(str(source), 'text')
+    assert segment.skipped is None
+    assert segment.encoding == encoding
+    assert segment.content == expected
+
+@pytest.mark.parametrize("name, text, expected", [
+    ("src/app.TS", None, 'typescript'),
+    ("Dockerfile", None, 'dockerfile'),
+    ("Dockerfile.prod", None, 'dockerfile'),
+    ("CMakeLists.txt", None, 'cmake'),
+    ("bin/tool", "#!/usr/bin/env python3\nprint()\n", 'python'),
+    ("bin/run", "#!/bin/sh -e\necho\n", 'bash'),
+    ("bin/serve", "#!/usr/bin/env -S deno run\n", 'typescript'),
+    ("conf/site", "# -*- mode: ruby -*-\n", 'ruby'),
+    ("conf/rules", "x = 1\n# vim: set ft=python:\n", 'python'),
+    ("notes/readme", "plain words\n", ''),
+])
+def test_detect_language(name, text, expected):
+    assert detect_language(os.path.join("detect", name), text) == expected
+
+def test_language_overrides(monkeypatch):
+    for table in ('EXTENSION_LANGUAGES', 'FILENAME_LANGUAGES', 'INTERPRETER_LANGUAGES'):
+        monkeypatch.setattr(concat_engine, table, dict(getattr(concat_engine, table)))
+    monkeypatch.setattr(concat_engine, '_language_memo', concat_engine.OrderedDict())
+    assert detect_language("over/Justfile") == ''
+    register_languages(parse_language_overrides(".txt=markdown; Justfile=make; #!deno=javascript"))
+    assert detect_language("over/notes.txt") == 'markdown'
+    assert detect_language("over/Justfile") == 'make'
+    assert detect_language("over/serve", "#!/usr/bin/env deno\n") == 'javascript'
+
+def test_read_segment_sniffs_language_from_content(tmp_path, monkeypatch):
+    script = tmp_path / "deploy"
+    script.write_text("#!/usr/bin/env bash\necho hi\n")
+    assert read_segment(str(script)).language == 'bash'
+    assert read_segment(str(script), cache=ContentCache()).language == 'bash'
+    script.write_text("#!/usr/bin/env python3\nprint('hi')\n")
+    assert read_segment(str(script)).language == 'python'
+    assert detect_language(str(script)) == 'python'
+
+    monkeypatch.setattr(concat_engine, 'MAX_LANGUAGE_MEMO', 2)
+    for name in ("a.py", "b.py", "c.py"):
+        detect_language(str(tmp_path / name))
+    assert list(concat_engine._language_memo) == [str(tmp_path / "b.py"), str(tmp_path / "c.py")]
+
+@pytest.mark.parametrize("language, source, expected", [
+    ('python', '#!/usr/bin/env python\n"""Doc."""\nx = "# kept"  # gone\n\ndef f():\n    """Only."""\n',
+     '#!/usr/bin/env python\nx = "# kept"\n\ndef f():\n    pass\n'),
+    ('javascript', 'const a = "http://x"; // gone\n/* gone\n */\nlet b = `// kept`;\n',
+     'const a = "http://x";\nlet b = `// kept`;\n'),
+    ('typescript', 'const re = /https?:\\/\\//; // gone\nconst half = a / b; // gone\nreturn /[/]x/g.test(s);\n',
+     'const re = /https?:\\/\\//;\nconst half = a / b;\nreturn /[/]x/g.test(s);\n'),
+    ('bash', '#!/bin/sh\necho $# # gone\n# gone\nx=\'#kept\'\n', '#!/bin/sh\necho $#\nx=\'#kept\'\n'),
+    ('sql', "SELECT 1; -- gone\nSELECT '--kept';\n", "SELECT 1;\nSELECT '--kept';\n"),
+    ('html', '<p>a</p><!-- gone -->\n<!--\ngone\n-->\n', '<p>a</p>\n'),
+    ('text', 'keep # this\n', 'keep # this\n'),
+    ('python', 'a = 1\x0c\nb = 2  # gone\ns = "\u2028"  # gone\nc = 3\n', 'a = 1\x0c\nb = 2\ns = "\u2028"\nc = 3\n'),
+    ('scss', '.a { background: url(http://example.com/a.png); } // gone\n',
+     '.a { background: url(http://example.com/a.png); }\n'),
+    ('less', '@import url(//fonts.googleapis.com/css?family=X);\n.b { c: d; } /* gone */\n',
+     '@import url(//fonts.googleapis.com/css?family=X);\n.b { c: d; }\n'),
+    ('php', "<?php\n#[Route('/x')]\nfunction f() {} # gone\n", "<?php\n#[Route('/x')]\nfunction f() {}\n"),
+    ('jsx', 'const A = () => <a href="/x">see http://example.com</a>; // gone\nlet b = a > c; // gone\n',
+     'const A = () => <a href="/x">see http://example.com</a>;\nlet b = a > c;\n'),
+    ('tsx', 'return (\n  <p>\n    don\'t see http://x.io\n  </p>\n); // gone\n',
+     'return (\n  <p>\n    don\'t see http://x.io\n  </p>\n);\n'),
+])
+def test_strip_comments(language, source, expected):
+    assert strip_comments(source, language) == expected
+
+def test_apply_transforms():
+    source = "// Copyright 2024 Example\n// SPDX-License-Identifier: MIT\n\nint a;   \n\n\n\nint b;\n"
+    assert apply_transforms(source, 'c', ('license', 'trailing_whitespace', 'blank_lines')) == "int a;\n\nint b;\n"
+    assert apply_transforms("// just a note\nint a;\n", 'c', ('license',)) == "// just a note\nint a;\n"
+    guarded = "#ifndef FOO_H\n#define FOO_H\n// Copyright 2024 Example\nint a;\n#endif\n"
+    assert apply_transforms(guarded, 'cpp', ('license',)) == guarded
+    assert apply_transforms("# Copyright 2024\nSELECT 1;\n", 'sql', ('license',)) == "# Copyright 2024\nSELECT 1;\n"
+    assert apply_transforms("-- Copyright 2024\nSELECT 1;\n", 'sql', ('license',)) == "SELECT 1;\n"
+    assert apply_transforms("#!/bin/sh\n# Copyright 2024\necho\n", 'bash', ('license',)) == "#!/bin/sh\necho\n"
+    assert apply_transforms("# Copyright 2024\nplain\n", '', ('license',)) == "# Copyright 2024\nplain\n"
+
+def test_iter_transformed_on_process_pool():
+    segments = [Segment(f"f{i}.py", f"x = {i}  # note\n\n\n\ny = {i}\n", 'python') for i in range(20)]
+    segments.append(Segment("missing.py", language='python', error="gone"))
+    with transform_executor(2) as pool:
+        result = list(iter_transformed(segments, TRANSFORMS, pool, batch_bytes=64, parallel_bytes=100))
+    assert [s.path for s in result] == [s.path for s in segments]
+    assert result[7].content == "x = 7\n\ny = 7\n"
+    assert result[7].reduced == (23, 5, 13, 3)
+    assert result[-1].reduced is None
+
+def test_concatenate_reports_reduction(tmp_path):
+    (tmp_path / "a.py").write_text("# comment\nx = 1\n")
+    out = io.StringIO()
+    stats = concatenate([str(tmp_path)], out, transforms=('comments',))
+    assert '# comment' not in out.getvalue()
+    assert stats['reduced'] == (16, 2, 6, 1)
+
+def test_duplicate_files_are_referenced(tmp_path):
+    (tmp_path / "a.py").write_text("VALUE = 1\n")
+    (tmp_path / "b.py").write_text("VALUE = 1\n")
+    (tmp_path / "c.py").write_text("if x:\n    a()\n    b()\n")
+    (tmp_path / "d.py").write_text("if x:\n    a()\nb()\n")
+    (tmp_path / "e.py").write_text("   \n")
+    (tmp_path / "f.py").write_text("   \n")
+    a, b, c = (read_segment(str(tmp_path / name)) for name in ("a.py", "b.py", "c.py"))
+    assert a.digest == b.digest != c.digest
+
+    out = io.StringIO()
+    stats = concatenate([str(tmp_path)], out, display_path=relative_display_path(str(tmp_path)))
+    text = out.getvalue()
+    assert text.count("VALUE") == 1
+    assert "# File: b.py\n(identical to a.py)\n" in text
+    assert "if x:\n    a()\n    b()\n" in text and "if x:\n    a()\nb()\n" in text
+    assert "# File: f.py\n```python\n   \n" in text
+    assert stats['duplicates'] == 1
+
+    out = io.StringIO()
+    assert concatenate([str(tmp_path)], out, deduplicate=False)['duplicates'] == 0
+    assert out.getvalue().count("VALUE") == 2
+
+def test_project_index_updates_incrementally(project_tree, tmp_path_factory):
+    index_dir = str(tmp_path_factory.mktemp("indexes"))
+    index = ProjectIndex(str(project_tree), index_dir)
+    assert index.update() == {'files': 0, 'added': 0, 'changed': 0, 'removed': 0}
+    assert index.update([str(project_tree)]) == {'files': 6, 'added': 6, 'changed': 0, 'removed': 0}
+    assert index.totals() == (6, 71, 8)
+    assert index.totals([str(project_tree / 'pkg'), str(project_tree / 'main.py')]) == (4, 39, 4)
+    module = index.entry(str(project_tree / 'pkg' / 'module.py'))
+    assert module['language'] == 'python' and module['lines'] == 1 and len(module['digest']) == 32
+    index.close()
+
+    (project_tree / 'main.py').write_text("print('main')\nprint('again')\n")
+    os.remove(project_tree / 'keep.log')
+    index = ProjectIndex(str(project_tree), index_dir)
+    assert index.totals()[0] == 6
+    assert index.update() == {'files': 5, 'added': 0, 'changed': 1, 'removed': 1}
+    assert index.entry(str(project_tree / 'main.py'))['lines'] == 2
+    assert index.entry(str(project_tree / 'keep.log')) is None
+
+    main = str(project_tree / 'main.py')
+    cache = ContentCache()
+    cache.backing = index
+    segment = read_segment(main, cache=cache)
+    assert segment.content == "print('main')\nprint('again')\n" and segment.language == 'python'
+    assert cache.stats()['backing_hits'] == 1 and cache.stats()['misses'] == 0
+    assert index.record([segment]) == 0
+    (project_tree / 'main.py').write_text("print('edited')\n")
+    assert read_segment(main, cache=cache).content == "print('edited')\n"
+    assert cache.stats()['misses'] == 1
+    index.close()
+
+def test_iter_search_streams_matches(project_tree):
+    (project_tree / 'pkg' / 'blob.bin').write_bytes(b'VALUE\0\1\2' * 100)
+    (project_tree / 'pkg' / 'more.py').write_text("x = 1\nvalue = 2\nVALUE = 3\n")
+    results = dict(iter_search([str(project_tree)], compile_search("value")))
+    assert str(project_tree / 'generated' / 'out.py') not in results
+    assert results[str(project_tree / 'pkg' / 'blob.bin')] is None
+    assert results[str(project_tree / 'pkg' / 'module.py')] == (1, [(1, 'VALUE = 1')])
+    assert results[str(project_tree / 'pkg' / 'more.py')] == (2, [(2, 'value = 2'), (3, 'VALUE = 3')])
+    strict = dict(iter_search([str(project_tree / 'pkg')], compile_search("VALUE")))
+    assert strict[str(project_tree / 'pkg' / 'more.py')] == (1, [(3, 'VALUE = 3')])
+    regex = dict(iter_search([str(project_tree / 'pkg')], compile_search(r"^x = \d", regex=True)))
+    assert regex[str(project_tree / 'pkg' / 'more.py')][0] == 1
+    assert regex[str(project_tree / 'pkg' / 'module.py')] is None
+
+def test_search_scans_oversized_files_in_full(tmp_path):
+    big = tmp_path / 'big.log'
+    big.write_text("noise\n" * 20000 + "needle here\n" + "noise\n" * 20000)
+    results = dict(iter_search([str(tmp_path)], compile_search("needle"), max_file_bytes=4096))
+    assert results[str(big)] == (1, [(20001, 'needle here')])
+    assert search_file(str(big), 'utf-8', compile_search("noise"), max_matches=30000, chunk_chars=1000)[0] == 30000
+
+def test_phase_timing_and_profile(project_tree, tmp_path_factory, capsys):
+    timer = enable_timing()
+    try:
+        concatenate([str(project_tree)], io.StringIO())
+        assert {'walk', 'read', 'decode', 'hash', 'format', 'write'} <= set(timer.phases)
+        assert timer.phases['read'][2] == 71
+        assert len(timer.slowest(3)) == 3
+        assert timer.summary().startswith("walk ")
+    finally:
+        enable_timing(False)
+    assert concat_engine.phase_timer() is None
+
+    profile = tmp_path_factory.mktemp("profile") / "run.prof"
+    assert main([str(project_tree), '-o', os.devnull, '--timing', '--profile', str(profile)]) == 0
+    enable_timing(False)
+    assert "Timing: walk" in capsys.readouterr().err
+    assert profile.stat().st_size > 0
+
+def test_snapshot_limits_output_to_changes(tmp_path):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "kept.py").write_text("a = 1\n")
+    (project / "edited.py").write_text("b = 1\nc = 2\n")
+    (project / "removed.py").write_text("d = 1\n")
+    snapshot_path = str(tmp_path / "snapshot.json.gz")
+    new_snapshot = Snapshot()
+    concatenate([str(project)], io.StringIO(), new_snapshot=new_snapshot)
+    new_snapshot.save(snapshot_path)
+
+    (project / "edited.py").write_text("b = 1\nc = 3\n")
+    (project / "removed.py").unlink()
+    (project / "added.py").write_text("e = 1\n")
+    snapshot = Snapshot.load(snapshot_path)
+    assert len(snapshot) == 3
+    out = io.StringIO()
+    stats = concatenate([str(project)], out, display_path=relative_display_path(str(project)),
+                        snapshot=snapshot, diff=True)
+    text = out.getvalue()
+    assert (stats['files'], stats['unchanged'], stats['deleted']) == (2, 1, 1)
+    assert "kept.py" not in text
+    assert "--- a/edited.py\n+++ b/edited.py\n@@ -1,2 +1,2 @@\n b = 1\n-c = 2\n+c = 3\n```" in text
+    assert "# File: added.py\n```python\ne = 1\n" in text
+    assert text.endswith("# Deleted 1 file(s) since snapshot:\n# - removed.py\n")
+
+def test_snapshot_normalizes_relative_entries(tmp_path, monkeypatch):
+    (tmp_path / "solo.py").write_text("a = 1\n")
+    (tmp_path / "other.py").write_text("b = 1\n")
+    monkeypatch.chdir(tmp_path)
+    snapshot = Snapshot()
+    concatenate(["solo.py", "other.py"], io.StringIO(), new_snapshot=snapshot)
+    assert sorted(snapshot.files) == [str(tmp_path / "other.py"), str(tmp_path / "solo.py")]
+
+    (tmp_path / "solo.py").unlink()
+    monkeypatch.chdir(tmp_path.parent)
+    out = io.StringIO()
+    stats = concatenate([str(tmp_path / "solo.py"), f"{tmp_path.name}/other.py"], out, snapshot=snapshot)
+    assert (stats['unchanged'], stats['deleted']) == (1, 1)
+    assert out.getvalue().endswith(f"# - {tmp_path / 'solo.py'}\n")
+
+def test_split_parts_keeps_files_whole_under_budget():
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("héé") == 3
+    small = [render_segment(Segment(f"f{i}.py", "x = 1\n" * 10, "python"), f"f{i}.py") for i in range(5)]
+    parts = split_parts(small, 50)
+    assert [len(pieces) for pieces, _ in parts] == [2, 2, 1]
+    assert all(tokens <= 50 for _, tokens in parts)
+    assert [piece for pieces, _ in parts for piece in pieces] == small
+
+    big = render_segment(Segment("big.py", "\n".join(f"line_{i} = {i}" for i in range(100)), "python"), "big.py")
+    pieces = [piece for piece_list, _ in split_parts([big], 60) for piece in piece_list]
+    assert len(pieces) > 1
+    for number, piece in enumerate(pieces, 1):
+        lines = piece.split("\n")
+        assert lines[0] == f"# File: big.py (part {number}/{len(pieces)})"
+        assert lines[1] == "```python" and lines[-2:] == ["```", ""]
+        assert estimate_tokens(piece) <= 60
+    body = [line for piece in pieces for line in piece.split("\n")[2:-2]]
+    assert body == [f"line_{i} = {i}" for i in range(100)]
+
+    wide = "注释" * 300 + "\n" + "x" * 500
+    block = render_segment(Segment("wide.md", wide, "markdown"), "wide.md")
+    parts = split_parts([block], 80)
+    assert len(parts) > 1 and all(tokens <= 80 for _, tokens in parts)
+    assert "".join(line for pieces, _ in parts for line in pieces[0].split("\n")[2:-2]) == wide.replace("\n", "")
+
+@pytest.mark.parametrize("name", ["drop.zip", "drop.tar.gz"])
+def test_archives_are_read_as_folders(tmp_path, name):
+    import tarfile, zipfile
+    members = {"proj/a.py": "print(1)\n", "proj/pkg/b.py": "x = 2\n", "proj/notes.md": "note\n"}
+    archive = tmp_path / name
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+            for member, text in members.items():
+                z.writestr(member, text)
+    else:
+        with tarfile.open(archive, "w:gz") as tar:
+            for member, text in members.items():
+                info = tarfile.TarInfo(member)
+                info.size = len(text)
+                tar.addfile(info, io.BytesIO(text.encode()))
+
+    assert concat_engine.split_archive_path(str(archive / "proj" / "a.py")) == (str(archive), "proj/a.py")
+    assert concat_engine.split_archive_path(str(tmp_path)) is None
+    assert concat_engine.archive_entry(str(archive / "proj" / "pkg")) == (True, 0, 0.0)
+    assert sorted(entry[:3] for entry in concat_engine.list_archive_directory(str(archive / "proj"))) == [
+        ("a.py", False, 9), ("notes.md", False, 5), ("pkg", True, 0)
+    ]
+    assert concat_engine.archive_listing(str(archive)) is concat_engine.archive_listing(str(archive))
+    assert list(iter_selection([str(archive)])) == [
+        str(archive / "proj" / "a.py"), str(archive / "proj" / "notes.md"), str(archive / "proj" / "pkg" / "b.py")
+    ]
+    assert list(iter_selection([str(archive)], {"include": ("*.py",), "exclude": ("pkg",)})) == [
+        str(archive / "proj" / "a.py")
+    ]
+
+    cache = ContentCache()
+    segment = read_segment(str(archive / "proj" / "pkg" / "b.py"), cache=cache)
+    assert (segment.content, segment.language, segment.size) == ("x = 2\n", "python", 6)
+    assert read_segment(str(archive / "proj" / "pkg" / "b.py"), cache=cache).content == "x = 2\n"
+    assert cache.stats()["hits"] == 1
+    assert read_segment(str(archive / "proj" / "missing.py")).error is not None
+
+def test_snapshot_round_trip_over_archive(tmp_path):
+    import zipfile
+    archive = tmp_path / "drop.zip"
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("a.py", "a = 1\n")
+        z.writestr("b.py", "b = 2\n")
+    snapshot = Snapshot()
+    concatenate([str(archive)], io.StringIO(), new_snapshot=snapshot)
+    snapshot.save(str(tmp_path / "snapshot.json.gz"))
+    snapshot = Snapshot.load(str(tmp_path / "snapshot.json.gz"))
+    assert sorted(snapshot.files) == [str(archive / "a.py"), str(archive / "b.py")]
+    stats = concatenate([str(archive)], io.StringIO(), snapshot=snapshot)
+    assert (stats['unchanged'], stats['deleted']) == (2, 0)
+
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("a.py", "a = 1\n")
+    stats = concatenate([str(archive)], io.StringIO(), snapshot=snapshot)
+    assert (stats['unchanged'], stats['deleted']) == (1, 1)
+    assert snapshot.deleted([str(archive)]) == [str(archive / "b.py")]
+
+def test_archive_reads_stream_members_and_release_handles(tmp_path, monkeypatch):
+    import tarfile, zipfile
+    members = {"a.py": "a = 1\n", "c.py": "c = 3\n", "b.py": "b = 2\n", "big.txt": "x" * 50000 + "\nend\n"}
+    tar_path, zip_path = tmp_path / "drop.tar.gz", tmp_path / "drop.zip"
+    with tarfile.open(tar_path, "w:gz") as tar, zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
+        for member, text in members.items():
+            info = tarfile.TarInfo(member)
+            info.size = len(text)
+            tar.addfile(info, io.BytesIO(text.encode()))
+            z.writestr(member, text)
+
+    listing = concat_engine.archive_listing(str(tar_path))
+    assert read_segment(str(tar_path / "a.py")).content == "a = 1\n"
+    assert read_segment(str(tar_path / "b.py")).content == "b = 2\n"
+    assert "c.py" in listing._buffered
+    assert read_segment(str(tar_path / "c.py")).content == "c = 3\n"
+    assert not listing._buffered
+    monkeypatch.setattr(concat_engine, "MAX_ARCHIVE_LISTINGS", 1)
+    for archive in (tar_path, zip_path):
+        segment = read_segment(str(archive / "big.txt"), max_bytes=4096)
+        assert segment.truncated and segment.content.startswith("x" * 2048) and segment.content.endswith("\nend\n")
+        assert "bytes omitted" in segment.content
+    assert listing._tar is None
+    zip_listing = concat_engine.archive_listing(str(zip_path))
+    zip_listing.close()
+    assert zip_listing._zip is None
+    assert read_segment(str(zip_path / "a.py")).content == "a = 1\n"
+    concat_engine.archive_listing(str(tar_path)).close()
@@ -4,9 +4,10 @@ import tempfile
 import shutil
 from pathlib import Path
 from PyQt5.QtWidgets import QApplication, QMessageBox, QToolBar
-from PyQt5.QtCore import Qt, QSettings, QPoint, QMimeData, QSize
+from PyQt5.QtCore import Qt, QSettings, QPoint, QMimeData, QSize, QPersistentModelIndex
 from PyQt5.QtGui import QDrag
-from file_concatenator import MainWindow, DraggableTextEdit
+import file_concatenator
+from file_concatenator import MainWindow, DraggableTextEdit, VirtualTextView, estimate_tokens, format_size
 
 @pytest.fixture(scope="session")
 def app():
@@ -214,4 +215,585 @@ def test_toolbar_alignment(window):
     assert main_toolbar.iconSize() == QSize(16, 16)
     assert main_toolbar.maximumHeight() == 28
     assert "background-color: #f8f9fa" in nav_bar.styleSheet()
-    assert "border-bottom: 1px solid #dee2e6" in nav_bar.styleSheet()
\ No newline at end of file
+    assert "border-bottom: 1px solid #dee2e6" in nav_bar.styleSheet()
+
+def test_background_read_preserves_selection_order(window, tmp_path, qtbot):
+    paths = []
+    for i in range(20):
+        file_path = tmp_path / f"file_{i:02d}.py"
+        file_path.write_text(f"value = {i}\n" * (i + 1), encoding='utf-8')
+        paths.append(str(file_path))
+
+    window.file_tree.setRootIndex(window.file_tree.model.index(str(tmp_path)))
+    for file_path in paths:
+        window.file_tree.selectionModel().select(
+            window.file_tree.model.index(file_path),
+            window.file_tree.selectionModel().Select
+        )
+
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 20 file(s)")
+    content = window.content_tabs.content_editor.toPlainText()
+    positions = [content.index(f"file_{i:02d}.py") for i in range(20)]
+    assert positions == sorted(positions)
+
+def test_stale_job_is_cancelled(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+
+    selection_model.select(window.file_tree.model.index(files[0]), selection_model.ClearAndSelect)
+    window._on_selection_changed(None, None)
+    stale_job = window._job_id
+    selection_model.select(window.file_tree.model.index(files[2]), selection_model.ClearAndSelect)
+    window._on_selection_changed(None, None)
+    assert window._job_id != stale_job
+
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 1 file(s)")
+    content = window.content_tabs.content_editor.toPlainText()
+    assert 'Plain text content' in content
+    assert 'def test1()' not in content
+
+def test_selection_bursts_are_coalesced(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    first_job = window.worker._job_id
+    for file_path in files[:4]:
+        selection_model.select(window.file_tree.model.index(file_path), selection_model.ClearAndSelect)
+    for file_path in files[:2]:
+        selection_model.select(window.file_tree.model.index(file_path), selection_model.Select)
+
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+    assert window.worker._job_id == first_job + 1
+
+def test_worker_failures_are_reported(window, temp_files, qtbot, monkeypatch):
+    from concurrent.futures.process import BrokenProcessPool
+    tmp_dir, files = temp_files
+
+    def broken(*args, **kwargs):
+        raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+        yield
+
+    monkeypatch.setattr(file_concatenator, "iter_segments", broken)
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    with qtbot.waitSignal(window.worker.failed):
+        selection_model.select(window.file_tree.model.index(files[0]), selection_model.Select)
+    assert window.statusBar().currentMessage() == (
+        "Reading selection failed: A process in the process pool was terminated abruptly"
+    )
+    assert not window._job_entries
+
+def test_selection_delta_drives_updates(window, temp_files, qtbot, monkeypatch):
+    tmp_dir, files = temp_files
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    for file_path in files[:3]:
+        selection_model.select(window.file_tree.model.index(file_path), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+
+    read_paths = []
+    original_read = file_concatenator.iter_segments.__globals__['read_segment']
+    def tracking_read(path, *args, **kwargs):
+        read_paths.append(path)
+        return original_read(path, *args, **kwargs)
+    monkeypatch.setitem(file_concatenator.iter_segments.__globals__, 'read_segment', tracking_read)
+
+    selection_model.select(window.file_tree.model.index(files[1]), selection_model.Deselect)
+    selection_model.select(window.file_tree.model.index(files[3]), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)"
+                    and 'Markdown Test' in window.content_tabs.text())
+    assert read_paths == [files[3]]
+
+    content = window.content_tabs.text()
+    assert 'function test2()' not in content
+    assert content.index('def test1()') < content.index('Plain text') < content.index('Markdown Test')
+    window._render_segments()
+    assert window.content_tabs.text() == content
+
+def test_reselection_hits_content_cache(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+
+    selection_model.select(window.file_tree.model.index(files[0]), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 1 file(s)")
+    selection_model.select(window.file_tree.model.index(files[1]), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 2 file(s)")
+    assert window.content_cache.stats()['misses'] == 2
+    assert window.content_cache.stats()['hits'] == 0
+
+    window._refresh()
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 2 file(s)")
+    stats = window.content_cache.stats()
+    assert stats['misses'] == 2
+    assert stats['hits'] == 2
+
+def test_path_toggle_rerenders_without_reading(window, temp_files, qtbot, monkeypatch):
+    tmp_dir, files = temp_files
+    window.path_toggle.setChecked(True)
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    selection_model.select(window.file_tree.model.index(files[0]), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 1 file(s)")
+    assert f"# File: {os.path.abspath(files[0])}" in window.content_tabs.content_editor.toPlainText()
+
+    def fail_open(*args, **kwargs):
+        raise AssertionError("re-render must not touch the disk")
+    monkeypatch.setattr("builtins.open", fail_open)
+
+    window.path_toggle.setChecked(False)
+    assert "# File: test1.py" in window.content_tabs.content_editor.toPlainText()
+
+    window._set_render_options(header_format="## {path}", fence="~~~")
+    content = window.content_tabs.content_editor.toPlainText()
+    assert "## test1.py" in content
+    assert "~~~python" in content
+    window._set_render_options(header_format="# File: {path}", fence="```")
+    window.path_toggle.setChecked(True)
+
+def test_folder_selection(window, project_tree, qtbot):
+    window.file_tree.setRootIndex(window.file_tree.model.index(str(project_tree)))
+    selection_model = window.file_tree.selectionModel()
+    selection_model.select(window.file_tree.model.index(str(project_tree / 'pkg')), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+    content = window.content_tabs.content_editor.toPlainText()
+    assert 'VALUE = 1' in content
+    assert 'TOKEN' not in content
+
+def test_binary_selection_is_summarised(window, tmp_path, qtbot):
+    (tmp_path / "code.py").write_text("x = 1", encoding='utf-8')
+    (tmp_path / "image.png").write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" * 10)
+    window.file_tree.setRootIndex(window.file_tree.model.index(str(tmp_path)))
+    selection_model = window.file_tree.selectionModel()
+    selection_model.select(window.file_tree.model.index(str(tmp_path)), selection_model.Select)
+
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 1 file(s), skipped 1")
+    content = window.content_tabs.content_editor.toPlainText()
+    assert "x = 1" in content
+    assert "# Skipped 1 file(s):" in content
+    assert "\x89PNG" not in content
+
+def test_virtual_text_view_lines():
+    view = VirtualTextView()
+    view.LINE_CHECKPOINT = 4
+    view.set_blocks(["a0\na1\na2", "\n".join(f"b{i}" for i in range(20))])
+    assert view.line_count() == 23
+    assert view.line(0) == "a0"
+    assert view.line(2) == "a2"
+    assert view.line(3) == "b0"
+    assert view.line(13) == "b10"
+    assert view.line(22) == "b19"
+    assert view.line(5) == "b2"
+    assert view.text().count("\n") == 22
+
+    view.insert_block(1, "c0\nc1")
+    view.replace_block(0, "a0")
+    view.remove_block(2)
+    assert view.line_count() == 3
+    assert [view.line(n) for n in range(3)] == ["a0", "c0", "c1"]
+
+@pytest.mark.parametrize("threshold", [10 ** 6, 0])
+def test_block_start_lines_follow_edits(window, threshold):
+    import random
+    tabs = window.content_tabs
+    tabs.large_content_threshold = threshold
+    blocks = ["\n".join(f"{i}.{n}" for n in range(i % 4 + 1)) for i in range(40)]
+    tabs.set_blocks(blocks)
+    rng = random.Random(7)
+    for step in range(60):
+        index = rng.randrange(len(blocks))
+        text = "\n".join(f"s{step}.{n}" for n in range(step % 3 + 1))
+        if step % 3 == 0:
+            tabs.insert_block(index, text)
+            blocks.insert(index, text)
+        elif step % 3 == 1:
+            tabs.replace_block(index, text)
+            blocks[index] = text
+        else:
+            tabs.remove_block(index)
+            del blocks[index]
+        probe = rng.randrange(len(blocks))
+        assert tabs.block_start_line(probe) == sum(block.count("\n") + 1 for block in blocks[:probe])
+    assert tabs.text() == "\n".join(blocks)
+    if threshold == 0:
+        assert tabs.is_large()
+        start = tabs.block_start_line(len(blocks) - 1)
+        assert tabs.large_view.line(start) == blocks[-1].split("\n")[0]
+
+def test_large_output_uses_virtual_view(window, tmp_path, qtbot, monkeypatch):
+    monkeypatch.setattr(window.content_tabs, 'large_content_threshold', 1000)
+    paths = []
+    for i in range(3):
+        file_path = tmp_path / f"big_{i}.txt"
+        file_path.write_text("\n".join(f"line {i}-{n}" for n in range(100)), encoding='utf-8')
+        paths.append(str(file_path))
+    window.file_tree.setRootIndex(window.file_tree.model.index(str(tmp_path)))
+    selection_model = window.file_tree.selectionModel()
+    for file_path in paths:
+        selection_model.select(window.file_tree.model.index(file_path), selection_model.Select)
+
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+    tabs = window.content_tabs
+    assert tabs.is_large()
+    assert tabs.content_editor.toPlainText() == ""
+    assert tabs.jump_list.count() == 3
+    assert "line 2-99" in tabs.text()
+
+    tabs._jump_to_entry(2)
+    assert tabs.large_view.first_visible_line() == tabs.block_start_line(2)
+    assert tabs.large_view.line(tabs.block_start_line(2)).endswith("big_2.txt")
+
+    window._copy()
+    assert QApplication.clipboard().text() == tabs.text()
+
+def test_output_is_spooled_for_copy_and_drag(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    for file_path in files[:2]:
+        selection_model.select(window.file_tree.model.index(file_path), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 2 file(s)")
+
+    tabs = window.content_tabs
+    shown = tabs.text()
+    mime_data, keepalive = tabs.drag_payload()
+    assert keepalive is None
+    spool_path = mime_data.urls()[0].toLocalFile()
+    assert spool_path == tabs.spool.path
+    with open(spool_path, 'rb') as f:
+        assert f.read().decode('utf-8') == shown
+    assert mime_data.text() == shown
+
+    window._copy()
+    tabs.spool.close()
+    assert QApplication.clipboard().text() == shown
+    assert not QApplication.clipboard().mimeData().hasUrls()
+
+    QApplication.clipboard().setText("edited elsewhere")
+    window._paste()
+    assert not tabs.spool.valid
+    mime_data, keepalive = tabs.drag_payload()
+    assert keepalive is not None
+    assert mime_data.text() == "edited elsewhere"
+
+def test_editing_invalidates_spool(window):
+    tabs = window.content_tabs
+    tabs.set_blocks(["# File: a.py", "# File: b.py"])
+    assert tabs.spool.valid
+    tabs.content_editor.appendPlainText("manual edit")
+    assert not tabs.spool.valid
+    window._copy()
+    assert QApplication.clipboard().text().endswith("manual edit")
+
+def test_selection_after_paste_replaces_pasted_text(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    selection_model.select(window.file_tree.model.index(files[0]), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 1 file(s)")
+    QApplication.clipboard().setText("PASTED")
+    window._paste()
+    selection_model.select(window.file_tree.model.index(files[2]), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 2 file(s)")
+    content = window.content_tabs.text()
+    assert "PASTED" not in content
+    assert content.index("def test1()") < content.index("Plain text content")
+
+def test_modified_file_is_refreshed_in_place(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    for file_path in files[:3]:
+        selection_model.select(window.file_tree.model.index(file_path), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+    assert files[1] in window.watcher.files()
+
+    Path(files[1]).write_text("function changed() {}\nextra line", encoding='utf-8')
+    qtbot.waitUntil(lambda: 'function changed()' in window.content_tabs.text(), timeout=5000)
+    content = window.content_tabs.text()
+    assert 'function test2()' not in content
+    assert content.index('def test1()') < content.index('function changed()') < content.index('Plain text')
+
+    mime_data, keepalive = window.content_tabs.drag_payload()
+    assert keepalive is None
+    assert mime_data.text() == content
+
+def test_new_file_in_watched_folder_is_added(window, project_tree, qtbot):
+    window.file_tree.setRootIndex(window.file_tree.model.index(str(project_tree)))
+    selection_model = window.file_tree.selectionModel()
+    selection_model.select(window.file_tree.model.index(str(project_tree / 'pkg')), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+
+    (project_tree / 'pkg' / 'added.py').write_text("ADDED = True", encoding='utf-8')
+    qtbot.waitUntil(lambda: 'ADDED = True' in window.content_tabs.text(), timeout=5000)
+
+@pytest.mark.parametrize("large", [False, True])
+def test_content_tabs_block_operations(window, large):
+    tabs = window.content_tabs
+    if large:
+        tabs.large_content_threshold = 0
+    tabs.set_blocks(["a\n", "b1\nb2\n", "c\n"], ["a", "b", "c"])
+    tabs.insert_block(0, "first\n", "first")
+    tabs.insert_block(2, "middle\n", "middle")
+    tabs.remove_block(4)
+    tabs.replace_block(1, "A\nA2\n")
+    tabs.remove_block(0)
+    tabs.insert_block(3, "last\n", "last")
+    expected = ["A\nA2\n", "middle\n", "b1\nb2\n", "last\n"]
+    assert tabs.is_large() == large
+    assert tabs.text() == "\n".join(expected)
+    tabs._rebuild_jump_list()
+    assert [tabs.jump_list.itemText(i) for i in range(tabs.jump_list.count())] == ["a", "middle", "b", "last"]
+    assert tabs.block_start_line(3) == 8
+    mime_data, _ = tabs.drag_payload()
+    assert mime_data.text() == "\n".join(expected)
+
+def test_reduction_transforms(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    source = os.path.join(tmp_dir, "reduce.py")
+    with open(source, 'w', encoding='utf-8') as f:
+        f.write('"""Docstring."""\n# comment\n\n\n\nVALUE = 1   \n')
+    window._set_transforms(())
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    selection_model.select(window.file_tree.model.index(source), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 1 file(s)")
+    assert '# comment' in window.content_tabs.text()
+
+    window._set_transforms(('comments', 'trailing_whitespace', 'blank_lines'))
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage().startswith("Selected 1 file(s); reduced"))
+    assert "43 B -> 10 B, 6 -> 1 lines" in window.statusBar().currentMessage()
+    content = window.content_tabs.text()
+    assert 'VALUE = 1\n' in content
+    assert 'Docstring' not in content and '# comment' not in content
+    window._set_transforms(())
+
+def test_duplicate_files_collapse_to_references(window, tmp_path, qtbot):
+    for name in ("a.py", "b.py", "c.py"):
+        (tmp_path / name).write_text("VALUE = 1\n", encoding='utf-8')
+    window.dedupe_action.setChecked(True)
+    window.path_toggle.setChecked(False)
+    window.file_tree.setRootIndex(window.file_tree.model.index(str(tmp_path)))
+    selection_model = window.file_tree.selectionModel()
+    for name in ("b.py", "c.py"):
+        selection_model.select(window.file_tree.model.index(str(tmp_path / name)), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 2 file(s), 1 duplicate(s)")
+    assert "# File: c.py\n(identical to b.py)" in window.content_tabs.text()
+
+    selection_model.select(window.file_tree.model.index(str(tmp_path / "a.py")), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s), 2 duplicate(s)")
+    content = window.content_tabs.text()
+    assert content.count("VALUE = 1") == 1
+    assert "# File: b.py\n(identical to a.py)" in content
+    assert "# File: c.py\n(identical to a.py)" in content
+
+    selection_model.select(window.file_tree.model.index(str(tmp_path / "a.py")), selection_model.Deselect)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 2 file(s), 1 duplicate(s)")
+    assert "# File: c.py\n(identical to b.py)" in window.content_tabs.text()
+
+    window.dedupe_action.setChecked(False)
+    assert window.content_tabs.text().count("VALUE = 1") == 2
+    window.dedupe_action.setChecked(True)
+    window.path_toggle.setChecked(True)
+
+def test_project_index_serves_reopened_folder(window, project_tree, tmp_path_factory, qtbot):
+    window.index_dir = str(tmp_path_factory.mktemp("indexes"))
+    window._initialize_with_path(str(project_tree))
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Indexed 0 file(s), 0 B, 0 lines")
+    selection_model = window.file_tree.selectionModel()
+    selection_model.select(window.file_tree.model.index(str(project_tree)), selection_model.Select)
+    window._on_selection_changed(None, None)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 6 file(s)")
+    assert window.project_index.totals() == (6, 71, 8)
+    selection_model.clearSelection()
+    window._on_selection_changed(None, None)
+    window._close_index()
+    assert window.content_cache.backing is None
+
+    window.content_cache.clear()
+    window._initialize_with_path(str(project_tree))
+    assert window.statusBar().currentMessage() == (
+        f"Opened folder: {project_tree} (6 file(s), 71 B, 8 lines indexed)"
+    )
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Indexed 6 file(s), 71 B, 8 lines")
+
+    selection_model.select(window.file_tree.model.index(str(project_tree / 'pkg')), selection_model.Select)
+    window._on_selection_changed(None, None)
+    assert window.statusBar().currentMessage() == "Reading selection (~3 file(s), 26 B, 3 lines indexed)..."
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+    assert window.content_cache.stats()['backing_hits'] == 3
+
+def test_content_search_selects_matches(window, tmp_path, qtbot):
+    for name, text in (("a.py", "alpha = 1\n"), ("b.md", "beta\nalpha, alpha\n"),
+                       ("sub/c.txt", "ALPHA\n"), ("d.txt", "gamma\n")):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text(text, encoding='utf-8')
+    window.file_tree.setRootIndex(window.file_tree.model.index(str(tmp_path)))
+    window.search_input.setText("[")
+    window.search_regex_toggle.setChecked(True)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage().startswith("Invalid pattern"))
+    window.search_regex_toggle.setChecked(False)
+    window.search_input.setText("ALPHA")
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Found matches in 1 of 4 file(s)")
+    window.search_input.setText("alpha")
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Found matches in 3 of 4 file(s)")
+    assert [window.search_results.item(i).text() for i in range(3)] == [
+        "a.py (1)", "b.md (2)", os.path.join("sub", "c.txt") + " (1)"
+    ]
+    assert window.search_results.item(1).toolTip() == "2: alpha, alpha"
+
+    window._select_search_matches()
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+    content = window.content_tabs.text()
+    assert "alpha = 1" in content and "ALPHA" in content and "gamma" not in content
+    window.search_input.clear()
+
+def test_phase_timing_summary(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    timer = file_concatenator.enable_timing()
+    try:
+        window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+        selection_model = window.file_tree.selectionModel()
+        selection_model.select(window.file_tree.model.index(files[0]), selection_model.Select)
+        qtbot.waitUntil(lambda: window.statusBar().currentMessage().startswith("Selected 1 file(s) [walk"))
+        message = window.statusBar().currentMessage()
+        assert "read" in message and "format" in message and "render" in message
+        assert timer.slowest()[0][0] == files[0]
+        assert "Slowest files:" in window.statusBar().toolTip()
+    finally:
+        file_concatenator.enable_timing(False)
+
+def test_tree_lists_directories_asynchronously(window, tmp_path, qtbot):
+    for i in range(30):
+        (tmp_path / f"file_{i:02d}.txt").write_text("x" * i)
+    (tmp_path / "sub").mkdir()
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "inner.txt").write_text("secret")
+    model = window.file_tree.model
+    nested = QPersistentModelIndex(model.index(str(tmp_path / "sub")))
+    assert nested.isValid() and model.isDir(model.index(str(tmp_path / "sub")))
+
+    with qtbot.waitSignal(model.directoryLoaded, check_params_cb=lambda path: path == str(tmp_path)):
+        window.file_tree.setRootIndex(model.index(str(tmp_path)))
+    root = window.file_tree.rootIndex()
+    assert model.rowCount(root) == 31
+    assert model.filePath(model.index(0, 0, root)) == str(tmp_path / "sub")
+    assert model.index(5, 1, root).data() == format_size(4)
+    assert ".hidden" not in [model.index(row, 0, root).data() for row in range(31)]
+    inner = model.index(str(tmp_path / ".hidden" / "inner.txt"))
+    assert inner.isValid() and model.filePath(inner) == str(tmp_path / ".hidden" / "inner.txt")
+
+    (tmp_path / "file_00.txt").unlink()
+    (tmp_path / "extra.txt").write_text("new")
+    with qtbot.waitSignal(model.directoryLoaded):
+        model.refresh(str(tmp_path))
+    names = [model.index(row, 0, root).data() for row in range(model.rowCount(root))]
+    assert "extra.txt" in names and "file_00.txt" not in names
+    assert model.index(str(tmp_path / "sub")) == nested
+    assert model.index(str(tmp_path / ".hidden" / "inner.txt")) == inner
+
+def test_second_launch_hands_path_to_running_instance(window, temp_files, qtbot):
+    import subprocess, sys, uuid
+    from single_instance import INSTANCE_ENV, InstanceServer, forward_to_running_instance
+    tmp_dir, files = temp_files
+    name = f"FileConcatenatorTest-{uuid.uuid4().hex[:8]}"
+    assert not forward_to_running_instance(tmp_dir, name)
+
+    server = InstanceServer()
+    assert server.listen(name)
+    server.path_received.connect(window._open_forwarded_path)
+    try:
+        env = dict(os.environ, **{INSTANCE_ENV: name})
+        script = os.path.join(os.path.dirname(os.path.abspath(file_concatenator.__file__)), 'file_concatenator.py')
+        launch = subprocess.Popen([sys.executable, script, files[0]], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        qtbot.waitUntil(lambda: launch.poll() is not None, timeout=20000)
+        assert launch.returncode == 0
+        qtbot.waitUntil(lambda: window.path_input.text() == tmp_dir)
+        assert window.file_tree.model.filePath(window.file_tree.rootIndex()) == tmp_dir
+    finally:
+        server.close()
+
+def test_changes_since_snapshot(window, temp_files, tmp_path_factory, qtbot):
+    tmp_dir, files = temp_files
+    window.snapshot_dir = str(tmp_path_factory.mktemp('snapshots'))
+    window._initialize_with_path(tmp_dir)
+    window.file_tree.selectionModel().select(window.file_tree.model.index(tmp_dir),
+                                             window.file_tree.selectionModel().Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 5 file(s)")
+    window._save_snapshot()
+    assert os.path.exists(file_concatenator.Snapshot.path_for(tmp_dir, window.snapshot_dir))
+    try:
+        window.changes_action.setChecked(True)
+        assert window.content_tabs.text() == ''
+
+        Path(files[1]).write_text("function test2() {\n    return 'changed';\n}", encoding='utf-8')
+        os.remove(files[3])
+        qtbot.waitUntil(lambda: "# Deleted 1 file(s) since snapshot:" in window.content_tabs.text(), timeout=5000)
+        qtbot.waitUntil(lambda: "'changed'" in window.content_tabs.text(), timeout=5000)
+        content = window.content_tabs.text()
+        assert 'def test1()' not in content and 'Plain text' not in content
+        assert "test4.md" in content.split("# Deleted")[1]
+
+        window.snapshot_diff_action.setChecked(True)
+        content = window.content_tabs.text()
+        assert "```diff" in content
+        assert "-    return 'test2';" in content and "+    return 'changed';" in content
+    finally:
+        window.snapshot_diff_action.setChecked(False)
+        window.changes_action.setChecked(False)
+
+def test_output_splits_into_parts_under_token_budget(window, temp_files, qtbot):
+    tmp_dir, files = temp_files
+    window.file_tree.setRootIndex(window.file_tree.model.index(tmp_dir))
+    selection_model = window.file_tree.selectionModel()
+    for file_path in files[:4]:
+        selection_model.select(window.file_tree.model.index(file_path), selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 4 file(s)")
+    tabs = window.content_tabs
+    budget = tabs.token_budget
+    try:
+        tabs._update_parts()
+        assert tabs.total_tokens == sum(estimate_tokens(block) for block in tabs._blocks)
+        assert tabs.token_label.text() == f"~{tabs.total_tokens} tokens"
+        assert tabs.parts == [] and not tabs.parts_list.isVisibleTo(tabs)
+
+        tabs.set_token_budget(max(tabs._block_tokens) + 1)
+        assert len(tabs.parts) == tabs.parts_list.count() > 1
+        assert tabs.parts_list.isVisibleTo(tabs)
+        assert '\n'.join(tabs.part_text(i) for i in range(len(tabs.parts))) == tabs.text()
+        tabs.copy_part(1)
+        assert QApplication.clipboard().text() == tabs.part_text(1)
+        assert window.statusBar().currentMessage().startswith(f"Copied part 2 of {len(tabs.parts)}")
+
+        selection_model.select(window.file_tree.model.index(files[0]), selection_model.Deselect)
+        qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 3 file(s)")
+        assert tabs.total_tokens == sum(estimate_tokens(block) for block in tabs._blocks)
+    finally:
+        tabs.set_token_budget(budget)
+
+def test_archive_browses_as_virtual_folder(window, tmp_path, qtbot):
+    import zipfile
+    with zipfile.ZipFile(tmp_path / "drop.zip", "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("src/main.py", "def main():\n    pass\n")
+        z.writestr("src/util/helpers.js", "export const x = 1;\n")
+    model = window.file_tree.model
+    with qtbot.waitSignal(model.directoryLoaded):
+        window.file_tree.setRootIndex(model.index(str(tmp_path)))
+    archive_index = model.index(str(tmp_path / "drop.zip"))
+    assert model.isDir(archive_index) and model.hasChildren(archive_index)
+    assert model.index(archive_index.row(), 2, archive_index.parent()).data() == "Archive"
+
+    with qtbot.waitSignal(model.directoryLoaded):
+        window.file_tree.expand(archive_index)
+    assert model.index(0, 0, archive_index).data() == "src"
+    nested = model.index(str(tmp_path / "drop.zip" / "src" / "util" / "helpers.js"))
+    assert nested.isValid() and not model.isDir(nested)
+
+    selection_model = window.file_tree.selectionModel()
+    selection_model.select(archive_index, selection_model.Select)
+    qtbot.waitUntil(lambda: window.statusBar().currentMessage() == "Selected 2 file(s)")
+    content = window.content_tabs.text()
+    assert f"# File: {tmp_path / 'drop.zip' / 'src' / 'main.py'}\n```python\ndef main():" in content
+    assert content.index("main.py") < content.index("helpers.js")